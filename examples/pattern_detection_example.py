@@ -54,10 +54,12 @@ async def analyze_transactions():
     ]
     
     print("Analyzing transactions for patterns...\n")
-    
-    for tx in transactions:
-        score = await detector.analyze_transaction(tx)
-        
+
+    # Score the whole batch in one call — the ML model sees a single
+    # (N, F) matrix instead of N single-row calls
+    scores = await detector.analyze_batch(transactions)
+
+    for tx, score in zip(transactions, scores):
         print(f"Transaction: {tx['tx_hash']}")
         print(f"Amount: {tx['amount']} USDC")
         print(f"Anomaly Score: {score:.4f}")
@@ -9,6 +9,7 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from dotenv import load_dotenv
+from web3 import Web3
 from src.rpc_connector import BaseRPCConnector
 from src.usdc_tracker import USDCTracker
 
@@ -21,39 +22,23 @@ async def monitor_address(address: str):
     """
     print(f"Monitoring USDC transfers for: {address}")
     print("Press Ctrl+C to stop\n")
-    
+
     # Initialize
     rpc = BaseRPCConnector()
     tracker = USDCTracker(rpc)
-    
-    last_block = await rpc.get_latest_block_number()
-    
+
+    address = Web3.to_checksum_address(address)
+
     try:
-        while True:
-            # Get latest block
-            current_block = await rpc.get_latest_block_number()
-            
-            if current_block > last_block:
-                # Check for new transfers
-                transfers = await tracker.get_transfers(
-                    from_block=last_block + 1,
-                    to_block=current_block,
-                    addresses=[address]
-                )
-                
-                # Print any new transfers
-                for tx in transfers:
-                    direction = "received" if tx['to'].lower() == address.lower() else "sent"
-                    print(f"\n✓ New transfer {direction}:")
-                    print(f"  Amount: {tx['amount']} USDC")
-                    print(f"  Block: {tx['blockNumber']}")
-                    print(f"  TX: {tx['transactionHash']}")
-                
-                last_block = current_block
-            
-            # Wait 12 seconds (Base block time is ~2 seconds)
-            await asyncio.sleep(12)
-    
+        # The node pushes matching logs over WebSocket as they happen —
+        # no polling, no missed blocks between polls
+        async for tx in tracker.subscribe_transfers(addresses=[address]):
+            direction = "received" if tx['to'] == address else "sent"
+            print(f"\n✓ New transfer {direction}:")
+            print(f"  Amount: {tx['amount']} USDC")
+            print(f"  Block: {tx['blockNumber']}")
+            print(f"  TX: {tx['transactionHash']}")
+
     except KeyboardInterrupt:
         print("\n\nStopping monitor...")
     finally:
@@ -8,69 +8,127 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 import asyncio
-from datetime import datetime
+import logging
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from pybloom_live import ScalableBloomFilter
 from src.rpc_connector import BaseRPCConnector
 from src.usdc_tracker import USDCTracker
-from src.database import SupabaseManager
+from src.database import get_database
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 
-async def backfill_blocks(from_block, to_block, batch_size=1000):
+async def backfill_blocks(from_block, to_block, batch_size=1000, max_concurrency=8, rpc=None):
     """Backfill historical data"""
-    print(f"Backfilling blocks {from_block} to {to_block}")
-    print(f"Batch size: {batch_size}")
-    print("=" * 50)
-    
-    rpc = BaseRPCConnector()
+    logger.info("Backfilling blocks %d to %d", from_block, to_block)
+    logger.info("Batch size: %d (up to %d batches in flight)", batch_size, max_concurrency)
+
+    # Reuse the caller's connector (and its connection pool) if given
+    if rpc is None:
+        rpc = BaseRPCConnector()
     tracker = USDCTracker(rpc)
-    db = SupabaseManager()
-    
+    db = get_database()
+
     total_transfers = 0
-    current = from_block
-    
-    while current <= to_block:
-        batch_end = min(current + batch_size, to_block)
-        
-        print(f"\nProcessing blocks {current} to {batch_end}...")
-        
+
+    # Bloom filter over already-inserted tx hashes so overlapping re-runs
+    # skip duplicate inserts; positives are confirmed with a cheap select
+    # since the filter can report false positives
+    seen_hashes = ScalableBloomFilter(initial_capacity=1_000_000, error_rate=0.001)
+    for record in await db.get_recent_transactions(limit=10000):
+        if record.get('tx_hash'):
+            seen_hashes.add(record['tx_hash'])
+
+    async def is_duplicate(tx_hash):
+        if tx_hash not in seen_hashes:
+            return False
+        return await db.get_transaction(tx_hash) is not None
+
+    async def get_block_timestamps(block_numbers, chunk_size=100):
+        """Fetch header timestamps for unique blocks via chunked batch RPCs"""
+        unique_blocks = sorted(set(block_numbers))
+
+        # Public providers cap JSON-RPC batch sizes; a wave's worth of
+        # headers can run to thousands of calls, so keep each POST small
+        headers = []
+        for i in range(0, len(unique_blocks), chunk_size):
+            chunk = unique_blocks[i:i + chunk_size]
+            headers.extend(await rpc.batch_call(
+                [('eth_getBlockByNumber', [hex(b), False]) for b in chunk]
+            ))
+
+        return {
+            block: datetime.fromtimestamp(int(header['timestamp'], 16), tz=timezone.utc).isoformat()
+            for block, header in zip(unique_blocks, headers)
+            if header
+        }
+
+    ranges = [
+        (current, min(current + batch_size, to_block))
+        for current in range(from_block, to_block + 1, batch_size + 1)
+    ]
+
+    # Fire windows in waves: each wave of eth_getLogs calls goes out as a
+    # single JSON-RPC batch request, so a wave costs one round-trip
+    for i in range(0, len(ranges), max_concurrency):
+        wave = ranges[i:i + max_concurrency]
+
+        logger.debug("Processing blocks %d to %d (%d windows)", wave[0][0], wave[-1][1], len(wave))
+
         try:
-            # Get transfers
-            transfers = await tracker.get_transfers(current, batch_end)
-            
-            print(f"Found {len(transfers)} transfers")
-            
-            # Save to database
+            batches = await tracker.get_transfers_batch(wave)
+            transfers = [transfer for batch in batches for transfer in batch]
+
+            logger.debug("Found %d transfers", len(transfers))
+
+            # Real per-tx timestamps come from the block headers, fetched
+            # once per unique block in a single batch RPC; fall back to a
+            # single import timestamp computed once per wave
+            block_ts = await get_block_timestamps(t['blockNumber'] for t in transfers)
+            now_iso = datetime.now(timezone.utc).isoformat()
+
+            # Save to database in one bulk insert per wave. Dedupe within
+            # the wave first — overlapping windows or duplicate logs would
+            # otherwise trip the unique constraint — then skip transfers
+            # the Bloom filter says we already inserted
+            wave_records = {}
             for transfer in transfers:
-                tx_record = {
-                    'tx_hash': transfer['transactionHash'],
+                tx_hash = transfer['transactionHash']
+                key = (tx_hash, transfer.get('logIndex', 0))
+                if key in wave_records:
+                    continue
+                if await is_duplicate(tx_hash):
+                    continue
+
+                wave_records[key] = ({
+                    'tx_hash': tx_hash,
                     'block_number': transfer['blockNumber'],
-                    'timestamp': datetime.now().isoformat(),
+                    'timestamp': block_ts.get(transfer['blockNumber'], now_iso),
                     'from_address': transfer['from'],
                     'to_address': transfer['to'],
                     'amount': transfer['amount'],
                     'status': 'confirmed',
                     'is_flagged': abs(transfer['amount'] - 100.0) < 0.01,
                     'pattern_score': 0.0
-                }
-                
-                await db.insert_transaction(tx_record)
-            
-            total_transfers += len(transfers)
-            print(f"\u2713 Saved {len(transfers)} transfers to database")
-            
+                })
+                seen_hashes.add(tx_hash)
+
+            tx_records = list(wave_records.values())
+            await db.insert_transactions(tx_records)
+
+            total_transfers += len(tx_records)
+            logger.info("\u2713 Saved %d transfers to database (%d duplicates skipped)",
+                        len(tx_records), len(transfers) - len(tx_records))
+
         except Exception as e:
-            print(f"Error processing batch: {e}")
-        
-        current = batch_end + 1
-        
-        # Rate limiting
-        await asyncio.sleep(1)
-    
-    print("\n" + "=" * 50)
-    print(f"\u2713 Backfill complete!")
-    print(f"Total transfers processed: {total_transfers}")
+            logger.error("Error processing wave %d-%d: %s", wave[0][0], wave[-1][1], e)
+
+        # Gentle pacing between waves
+        await asyncio.sleep(0.1)
+
+    logger.info("\u2713 Backfill complete! Total transfers processed: %d", total_transfers)
     
     await rpc.close()
     await db.close()
@@ -118,9 +176,12 @@ async def main():
         print("Cancelled")
         return
     
-    await rpc.close()
-    await backfill_blocks(from_block, current_block)
+    await backfill_blocks(from_block, current_block, rpc=rpc)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     asyncio.run(main())
\ No newline at end of file
@@ -121,6 +121,31 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to fetch transactions touching an address. The UNION ALL of
+-- two single-column equality queries hits idx_transactions_from_address
+-- and idx_transactions_to_address directly, where an OR across both
+-- columns degrades to a BitmapOr or sequential scan.
+CREATE OR REPLACE FUNCTION txs_by_address(addr TEXT, lim INT DEFAULT 100)
+RETURNS SETOF transactions AS $$
+    SELECT * FROM (
+        SELECT * FROM transactions WHERE from_address = addr
+        UNION ALL
+        SELECT * FROM transactions WHERE to_address = addr AND from_address <> addr
+    ) t
+    ORDER BY timestamp DESC
+    LIMIT lim;
+$$ LANGUAGE sql STABLE;
+
+-- Function returning the monitor's summary counts in one round-trip
+-- instead of three separate count queries
+CREATE OR REPLACE FUNCTION monitor_stats()
+RETURNS TABLE(total_transactions BIGINT, flagged_transactions BIGINT, total_alerts BIGINT) AS $$
+    SELECT
+        (SELECT count(*) FROM transactions),
+        (SELECT count(*) FROM transactions WHERE is_flagged),
+        (SELECT count(*) FROM alerts);
+$$ LANGUAGE sql STABLE;
+
 -- Row Level Security (RLS) - Optional
 -- Enable RLS if you want to restrict access
 -- ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
@@ -8,42 +8,67 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 import asyncio
-import json
 import csv
+
+import aiofiles
+import orjson
 from datetime import datetime
 from dotenv import load_dotenv
-from src.database import SupabaseManager
+from src.database import get_database
 
 load_dotenv()
 
 
-async def export_to_csv(data, filename):
-    """Export data to CSV file"""
-    if not data:
-        print("No data to export")
-        return
-    
+async def iter_records(data):
+    """Wrap an already-fetched list as an async iterator"""
+    for record in data:
+        yield record
+
+
+async def export_to_csv(records, filename):
+    """Export records to CSV file, streaming row by row"""
+    count = 0
+
     with open(filename, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-    
+        writer = None
+        async for record in records:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=record.keys())
+                writer.writeheader()
+            writer.writerow(record)
+            count += 1
+
+    if count == 0:
+        print("No data to export")
+        return 0
+
     print(f"\u2713 Exported to {filename}")
+    return count
 
 
-async def export_to_json(data, filename):
-    """Export data to JSON file"""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2, default=str)
-    
+async def export_to_json(records, filename):
+    """Export records to JSON file, streaming one record at a time"""
+    count = 0
+
+    # orjson serializes ~5-10x faster than stdlib json, and aiofiles keeps
+    # disk writes off the event loop
+    async with aiofiles.open(filename, 'wb') as f:
+        await f.write(b'[')
+        async for record in records:
+            await f.write(b',\n' if count else b'\n')
+            await f.write(orjson.dumps(record, option=orjson.OPT_INDENT_2, default=str))
+            count += 1
+        await f.write(b'\n]' if count else b']')
+
     print(f"\u2713 Exported to {filename}")
+    return count
 
 
 async def main():
     print("Data Export Utility")
     print("=" * 50)
     
-    db = SupabaseManager()
+    db = get_database()
     
     # Export options
     print("\nExport options:")
@@ -55,34 +80,35 @@ async def main():
     choice = input("\nSelect export (1-4): ")
     format_choice = input("Format (csv/json): ").lower()
     
-    data = []
+    records = None
     filename = ""
-    
+
     if choice == "1":
-        data = await db.get_recent_transactions(limit=100)
+        # Stream pages from the database instead of loading the full table
+        records = db.iter_recent_transactions(page_size=1000)
         filename = f"transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     elif choice == "2":
-        data = await db.get_flagged_transactions(limit=100)
+        records = iter_records(await db.get_flagged_transactions(limit=100))
         filename = f"flagged_transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     elif choice == "3":
-        data = await db.get_transactions_by_amount(100.0, tolerance=0.01, limit=100)
+        records = iter_records(await db.get_transactions_by_amount(100.0, tolerance=0.01, limit=100))
         filename = f"100usdc_transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     elif choice == "4":
-        data = await db.get_alerts(limit=100)
+        records = iter_records(await db.get_alerts(limit=100))
         filename = f"alerts_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     else:
         print("Invalid choice")
         return
-    
+
     if format_choice == "csv":
-        await export_to_csv(data, f"data/{filename}.csv")
+        count = await export_to_csv(records, f"data/{filename}.csv")
     elif format_choice == "json":
-        await export_to_json(data, f"data/{filename}.json")
+        count = await export_to_json(records, f"data/{filename}.json")
     else:
         print("Invalid format")
         return
-    
-    print(f"\nExported {len(data)} records")
+
+    print(f"\nExported {count} records")
     await db.close()
 
 
@@ -8,14 +8,30 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 import asyncio
+import numpy as np
 from dotenv import load_dotenv
 from src.usdc_tracker import USDCTracker
 from src.rpc_connector import BaseRPCConnector
-from tabulate import tabulate
 
 load_dotenv()
 
 
+def print_table(rows, headers):
+    """Print rows as a fixed-width table (no tabulate dependency)"""
+    widths = [
+        max(len(str(headers[i])), max((len(str(r[i])) for r in rows), default=0))
+        for i in range(len(headers))
+    ]
+
+    def fmt(row):
+        return " | ".join(str(v).ljust(w) for v, w in zip(row, widths))
+
+    print(fmt(headers))
+    print("-+-".join("-" * w for w in widths))
+    for row in rows:
+        print(fmt(row))
+
+
 async def main():
     print("USDC Address Query Tool")
     print("=" * 50)
@@ -55,12 +71,20 @@ async def main():
     balance = await tracker.get_balance(address)
     print(f"Current USDC Balance: {balance:,.2f} USDC\n")
     
+    # Build columnar arrays once; boolean masks replace per-transfer
+    # Python loops for the statistics below
+    addr_lc = address.lower()
+    amounts = np.fromiter((tx['amount'] for tx in transfers), dtype=np.float64, count=len(transfers))
+    from_lc = np.array([tx['from'].lower() for tx in transfers])
+    to_lc = np.array([tx['to'].lower() for tx in transfers])
+    is_outgoing = from_lc == addr_lc
+
     # Display transfers
     table_data = []
-    for tx in transfers[:20]:  # Show first 20
-        direction = "OUT" if tx['from'].lower() == address.lower() else "IN"
+    for i, tx in enumerate(transfers[:20]):  # Show first 20
+        direction = "OUT" if is_outgoing[i] else "IN"
         other_party = tx['to'] if direction == "OUT" else tx['from']
-        
+
         table_data.append([
             tx['blockNumber'],
             direction,
@@ -68,17 +92,17 @@ async def main():
             f"{other_party[:10]}...{other_party[-8:]}",
             f"{tx['transactionHash'][:10]}..."
         ])
-    
+
     headers = ["Block", "Direction", "Amount (USDC)", "Other Party", "TX Hash"]
-    print(tabulate(table_data, headers=headers, tablefmt="grid"))
-    
+    print_table(table_data, headers)
+
     if len(transfers) > 20:
         print(f"\n... and {len(transfers) - 20} more transactions")
-    
+
     # Statistics
-    total_in = sum(tx['amount'] for tx in transfers if tx['to'].lower() == address.lower())
-    total_out = sum(tx['amount'] for tx in transfers if tx['from'].lower() == address.lower())
-    
+    total_in = amounts[to_lc == addr_lc].sum()
+    total_out = amounts[is_outgoing].sum()
+
     print("\n" + "=" * 50)
     print("Statistics:")
     print(f"Total Received: {total_in:,.2f} USDC")
@@ -18,22 +18,22 @@ async def main():
     print("=" * 50)
     
     try:
-        # Initialize alert manager
-        alert_mgr = AlertManager()
-        
-        print("\n[Test] Sending test alerts to all configured channels...")
-        print(f"Telegram: {alert_mgr.telegram_enabled}")
-        print(f"Email: {alert_mgr.email_enabled}")
-        print(f"Discord: {alert_mgr.discord_enabled}")
-        print(f"Webhook: {alert_mgr.webhook_enabled}")
-        
-        # Send test alert
-        await alert_mgr.test_alerts()
-        
+        # Initialize alert manager; the context manager closes the HTTP
+        # session and SMTP connection on exit
+        async with AlertManager() as alert_mgr:
+            print("\n[Test] Sending test alerts to all configured channels...")
+            print(f"Telegram: {alert_mgr.telegram_enabled}")
+            print(f"Email: {alert_mgr.email_enabled}")
+            print(f"Discord: {alert_mgr.discord_enabled}")
+            print(f"Webhook: {alert_mgr.webhook_enabled}")
+
+            # Send test alert
+            await alert_mgr.test_alerts()
+
         print("\n" + "=" * 50)
         print("✓ Alert test completed!")
         print("Check your configured channels for test messages.")
-        
+
     except Exception as e:
         print(f"\n✗ Error: {e}")
         import traceback
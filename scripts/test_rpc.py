@@ -17,20 +17,21 @@ async def main():
     print("Testing Base RPC Connection...")
     print("=" * 50)
     
+    rpc = None
     try:
         # Initialize RPC connector
         rpc = BaseRPCConnector()
-        
+
         # Test 1: Get latest block
         print("\n[Test 1] Getting latest block number...")
         block_number = await rpc.get_latest_block_number()
         print(f"\u2713 Latest block: {block_number}")
         
-        # Test 2: Get block details
+        # Test 2: Get block details (raw JSON-RPC dict with hex-string fields)
         print("\n[Test 2] Getting block details...")
         block = await rpc.get_block(block_number)
-        print(f"\u2713 Block hash: {block.get('hash').hex() if block.get('hash') else 'N/A'}")
-        print(f"\u2713 Timestamp: {block.get('timestamp')}")
+        print(f"\u2713 Block hash: {block.get('hash', 'N/A')}")
+        print(f"\u2713 Timestamp: {int(block['timestamp'], 16) if block.get('timestamp') else 'N/A'}")
         print(f"\u2713 Transactions: {len(block.get('transactions', []))}")
         
         # Test 3: Get USDC balance
@@ -46,7 +47,10 @@ async def main():
     except Exception as e:
         print(f"\n✗ Error: {e}")
         return False
-    
+    finally:
+        if rpc is not None:
+            await rpc.close()
+
     return True
 
 if __name__ == "__main__":
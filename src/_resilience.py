@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Shared Resilience Helpers
+Retry and backoff primitives used by the HTTP API clients and alert channels
+"""
+
+import asyncio
+import logging
+import random
+import time
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Transient statuses worth retrying; 4xx auth/client errors are not here
+# on purpose — retrying those only burns quota
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class TransientError(Exception):
+    """
+    Raised for HTTP responses that are worth retrying (429/5xx and friends)
+    """
+
+    def __init__(self, status: int, retry_after: float = None):
+        super().__init__(f"Transient HTTP error {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def raise_for_transient(response):
+    """
+    Raise TransientError if the response carries a retryable status
+
+    Honors the Retry-After header (seconds form) when the server sends one.
+    """
+    if response.status in RETRY_STATUSES:
+        retry_after = None
+        header = response.headers.get('Retry-After')
+        if header:
+            try:
+                retry_after = float(header)
+            except ValueError:
+                retry_after = None
+        raise TransientError(response.status, retry_after)
+
+
+class CircuitOpen(Exception):
+    """
+    Raised when a circuit breaker is open and calls are failing fast
+    """
+
+    def __init__(self, endpoint: str):
+        super().__init__(f"Circuit open for {endpoint}")
+        self.endpoint = endpoint
+
+
+class CircuitBreaker:
+    """
+    CLOSED/OPEN/HALF_OPEN circuit breaker for one upstream endpoint
+
+    After failure_threshold consecutive failures the breaker opens and
+    calls fail fast; once recovery_timeout passes it half-opens and lets
+    a limited number of probe calls through.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed right now"""
+        if self._state == 'open':
+            if time.monotonic() - self._opened_at < self.recovery_timeout:
+                return False
+            self._state = 'half_open'
+            self._half_open_calls = 0
+
+        if self._state == 'half_open':
+            if self._half_open_calls >= self.half_open_max_calls:
+                return False
+            self._half_open_calls += 1
+
+        return True
+
+    def on_success(self):
+        """Record a successful call and close the breaker"""
+        self._failures = 0
+        self._state = 'closed'
+
+    def on_failure(self):
+        """Record a failed call, opening the breaker at the threshold"""
+        self._failures += 1
+        if self._state == 'half_open' or self._failures >= self.failure_threshold:
+            self._state = 'open'
+            self._opened_at = time.monotonic()
+            self._failures = 0
+
+
+# One breaker per upstream host, shared across clients in the process
+_breakers = {}
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """Return the process-wide breaker for an endpoint, creating it once"""
+    if endpoint not in _breakers:
+        _breakers[endpoint] = CircuitBreaker()
+    return _breakers[endpoint]
+
+
+async def call_with_breaker(endpoint: str, fn):
+    """
+    Run an async callable behind the endpoint's circuit breaker
+
+    Sits outside any retry wrapper so repeated retries count as one
+    failure and can't mask a sustained outage.
+
+    Raises:
+        CircuitOpen: If the breaker is open and the call was skipped
+    """
+    breaker = get_breaker(endpoint)
+    if not breaker.allow():
+        raise CircuitOpen(endpoint)
+
+    try:
+        result = await fn()
+    except Exception:
+        breaker.on_failure()
+        raise
+
+    breaker.on_success()
+    return result
+
+
+async def retry_async(fn, *, retries: int = 5, base: float = 0.25, cap: float = 8.0,
+                      retry_on: tuple = (aiohttp.ClientError, asyncio.TimeoutError, TransientError)):
+    """
+    Run an async callable, retrying transient failures with backoff
+
+    Uses exponential backoff with full jitter
+    (delay = uniform(0, base * 2**attempt), capped) so concurrent retriers
+    don't synchronize into retry storms. Server-provided Retry-After takes
+    precedence when longer.
+
+    Args:
+        fn: Zero-argument coroutine function to run
+        retries: Maximum number of attempts
+        base: Base delay in seconds
+        cap: Maximum delay in seconds
+        retry_on: Exception types considered transient
+
+    Returns:
+        The callable's result
+
+    Raises:
+        The last transient error if all attempts fail
+    """
+    for attempt in range(retries):
+        try:
+            return await fn()
+        except retry_on as e:
+            if attempt == retries - 1:
+                raise
+
+            delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+            logger.warning(
+                "Transient failure (%s), attempt %d/%d, retrying in %.2fs",
+                e, attempt + 1, retries, delay
+            )
+            await asyncio.sleep(delay)
@@ -5,16 +5,30 @@ Handles sending alerts through multiple channels (Telegram, Email, Discord, Webh
 """
 
 import asyncio
+import html
 import logging
 import os
-import smtplib
+import string
+import time
+from datetime import datetime, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+import aiosmtplib
+from urllib.parse import urlparse
 import aiohttp
-from dotenv import load_dotenv
+import orjson
+try:
+    from . import config
+except ImportError:
+    import config
+
+try:
+    from ._resilience import retry_async, raise_for_transient, call_with_breaker, CircuitOpen
+except ImportError:
+    from _resilience import retry_async, raise_for_transient, call_with_breaker, CircuitOpen
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
 
@@ -22,7 +36,46 @@ class AlertManager:
     """
     Manages multi-channel alert delivery
     """
-    
+
+    # Severity lookups are constants; build them once at class level
+    _EMOJI = {
+        'low': '🔵',
+        'medium': '🟡',
+        'high': '🔴',
+        'critical': '🔴‼️'
+    }
+    _COLOR = {
+        'low': 3447003,      # Blue
+        'medium': 16776960,  # Yellow
+        'high': 16711680,    # Red
+        'critical': 10038562 # Dark red
+    }
+    _HTML_COLOR = {
+        'high': 'red',
+        'medium': 'orange'
+    }
+
+    # Payloads are encoded with orjson instead of aiohttp's stdlib
+    # json= path, so the Content-Type is set explicitly
+    _JSON_HEADERS = {'Content-Type': 'application/json'}
+
+    # Email HTML skeleton, compiled once instead of re-built per alert
+    _EMAIL_TMPL = string.Template("""
+    <html>
+      <head></head>
+      <body>
+        <h2 style="color: ${color};">Base USDC Monitor Alert</h2>
+        <p><strong>Severity:</strong> ${severity}</p>
+        <p><strong>Alert Type:</strong> ${subject}</p>
+        <hr>
+        <pre style="background-color: #f4f4f4; padding: 10px; border-radius: 5px;">${message}</pre>
+        ${tx_line}
+        <hr>
+        <p><em>Sent by Base USDC Monitor</em></p>
+      </body>
+    </html>
+    """)
+
     def __init__(self):
         # Telegram configuration
         self.telegram_enabled = os.getenv('TELEGRAM_ENABLED', 'false').lower() == 'true'
@@ -45,9 +98,49 @@ class AlertManager:
         self.webhook_enabled = os.getenv('WEBHOOK_ENABLED', 'false').lower() == 'true'
         self.webhook_url = os.getenv('WEBHOOK_URL')
         self.webhook_secret = os.getenv('WEBHOOK_SECRET')
-        
+
+        # Per-channel bulkheads: a slow or hung channel can only tie up
+        # its own slots, never starve the others in send_alert's gather
+        self._sem = {
+            'telegram': asyncio.Semaphore(4),
+            'email': asyncio.Semaphore(2),
+            'discord': asyncio.Semaphore(4),
+            'webhook': asyncio.Semaphore(4)
+        }
+
+        # Shared HTTP session for all channels (created lazily). The pool
+        # keeps one keep-alive connection per host, so bursty multi-channel
+        # alerts skip the TCP+TLS handshake per send
+        self._session = None
+
+        # Persistent SMTP connection, reused across alerts instead of
+        # paying connect+STARTTLS+login per email; recycled on error
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._smtp_lock = asyncio.Lock()
+
         logger.info(f"Alert Manager initialized - Telegram: {self.telegram_enabled}, Email: {self.email_enabled}, Discord: {self.discord_enabled}")
-    
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Create the shared aiohttp session on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session and SMTP connection"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        await self._close_smtp()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
     async def send_alert(self, alert_type: str, severity: str, message: str, 
                         transaction_id: str = None):
         """
@@ -61,26 +154,35 @@ class AlertManager:
         """
         try:
             tasks = []
-            
+
             if self.telegram_enabled:
-                tasks.append(self._send_telegram(message, severity))
-            
+                tasks.append(self._with_bulkhead('telegram', self._send_telegram(message, severity)))
+
             if self.email_enabled:
-                tasks.append(self._send_email(alert_type, message, severity, transaction_id))
-            
+                tasks.append(self._with_bulkhead('email', self._send_email(alert_type, message, severity, transaction_id)))
+
             if self.discord_enabled:
-                tasks.append(self._send_discord(message, severity, alert_type))
-            
+                tasks.append(self._with_bulkhead('discord', self._send_discord(message, severity, alert_type)))
+
             if self.webhook_enabled:
-                tasks.append(self._send_webhook(alert_type, message, severity, transaction_id))
+                tasks.append(self._with_bulkhead('webhook', self._send_webhook(alert_type, message, severity, transaction_id)))
             
-            # Send all alerts concurrently
+            # Send all alerts concurrently, under one end-to-end deadline
+            # so a stalled channel can't hang the caller indefinitely
             if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-            
+                async with asyncio.timeout(20):
+                    await asyncio.gather(*tasks, return_exceptions=True)
+
+        except TimeoutError:
+            logger.error("Alert delivery timed out after 20s")
         except Exception as e:
             logger.error(f"Error sending alert: {e}", exc_info=True)
     
+    async def _with_bulkhead(self, channel: str, coro):
+        """Run a channel send inside that channel's semaphore bulkhead"""
+        async with self._sem[channel]:
+            return await coro
+
     async def _send_telegram(self, message: str, severity: str):
         """Send alert via Telegram"""
         try:
@@ -89,30 +191,30 @@ class AlertManager:
                 return
             
             # Add severity emoji
-            emoji_map = {
-                'low': '🔵',
-                'medium': '🟡',
-                'high': '🔴',
-                'critical': '🔴‼️'
-            }
-            emoji = emoji_map.get(severity, '🔔')
-            
+            emoji = self._EMOJI.get(severity, '🔔')
+
             formatted_message = f"{emoji} {message}"
             
             url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json={
+
+            async def do_request():
+                session = await self._get_session()
+                async with session.post(url, data=orjson.dumps({
                     'chat_id': self.telegram_chat_id,
                     'text': formatted_message,
                     'parse_mode': 'Markdown',
                     'disable_web_page_preview': True
-                }) as response:
+                }), headers=self._JSON_HEADERS) as response:
+                    raise_for_transient(response)
                     if response.status == 200:
                         logger.info("✓ Telegram alert sent")
                     else:
                         logger.error(f"Telegram API error: {response.status}")
-        
+
+            await call_with_breaker('api.telegram.org', lambda: retry_async(do_request))
+
+        except CircuitOpen:
+            logger.warning("Telegram circuit open, skipping alert")
         except Exception as e:
             logger.error(f"Error sending Telegram alert: {e}")
     
@@ -129,36 +231,61 @@ class AlertManager:
             msg['From'] = self.email_from
             msg['To'] = ', '.join(self.email_to)
             
-            # Create HTML content
-            html_message = f"""
-            <html>
-              <head></head>
-              <body>
-                <h2 style="color: {'red' if severity == 'high' else 'orange' if severity == 'medium' else 'blue'};">Base USDC Monitor Alert</h2>
-                <p><strong>Severity:</strong> {severity.upper()}</p>
-                <p><strong>Alert Type:</strong> {subject}</p>
-                <hr>
-                <pre style="background-color: #f4f4f4; padding: 10px; border-radius: 5px;">{message}</pre>
-                {f'<p><strong>Transaction:</strong> <a href="https://basescan.org/tx/{transaction_id}">{transaction_id}</a></p>' if transaction_id else ''}
-                <hr>
-                <p><em>Sent by Base USDC Monitor</em></p>
-              </body>
-            </html>
-            """
+            # Fill the precompiled HTML skeleton; escape user-influenced
+            # fields so message content can't inject markup
+            tx_line = (
+                f'<p><strong>Transaction:</strong> <a href="https://basescan.org/tx/{transaction_id}">{transaction_id}</a></p>'
+                if transaction_id else ''
+            )
+            html_message = self._EMAIL_TMPL.substitute(
+                color=self._HTML_COLOR.get(severity, 'blue'),
+                severity=severity.upper(),
+                subject=html.escape(subject),
+                message=html.escape(message),
+                tx_line=tx_line
+            )
             
             msg.attach(MIMEText(message, 'plain'))
             msg.attach(MIMEText(html_message, 'html'))
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_from, self.email_password)
-                server.send_message(msg)
-            
+
+            try:
+                smtp = await self._get_smtp()
+                await smtp.send_message(msg)
+            except Exception:
+                # Recycle the connection so the next alert reconnects
+                await self._close_smtp()
+                raise
+
             logger.info("✓ Email alert sent")
-        
+
         except Exception as e:
             logger.error(f"Error sending email alert: {e}")
+
+    async def _get_smtp(self) -> aiosmtplib.SMTP:
+        """Return the persistent SMTP connection, (re)opening if needed"""
+        async with self._smtp_lock:
+            if self._smtp is None or not self._smtp.is_connected:
+                self._smtp = aiosmtplib.SMTP(
+                    hostname=self.smtp_server,
+                    port=self.smtp_port,
+                    timeout=10
+                )
+                # connect() already upgrades via STARTTLS when the server
+                # advertises it; an explicit starttls() on top would raise
+                # "Connection already using TLS"
+                await self._smtp.connect()
+                await self._smtp.login(self.email_from, self.email_password)
+            return self._smtp
+
+    async def _close_smtp(self):
+        """Tear down the persistent SMTP connection"""
+        async with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    await self._smtp.quit()
+                except Exception:
+                    pass
+                self._smtp = None
     
     async def _send_discord(self, message: str, severity: str, alert_type: str):
         """Send alert via Discord webhook"""
@@ -167,19 +294,11 @@ class AlertManager:
                 logger.warning("Discord webhook not configured")
                 return
             
-            # Color based on severity
-            color_map = {
-                'low': 3447003,      # Blue
-                'medium': 16776960,  # Yellow
-                'high': 16711680,    # Red
-                'critical': 10038562 # Dark red
-            }
-            
             embed = {
                 'title': f'Base USDC Monitor Alert: {alert_type}',
                 'description': message,
-                'color': color_map.get(severity, 3447003),
-                'timestamp': asyncio.get_event_loop().time(),
+                'color': self._COLOR.get(severity, 3447003),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
                 'footer': {'text': 'Base USDC Monitor'}
             }
             
@@ -187,13 +306,19 @@ class AlertManager:
                 'embeds': [embed]
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.discord_webhook, json=payload) as response:
+            async def do_request():
+                session = await self._get_session()
+                async with session.post(self.discord_webhook, data=orjson.dumps(payload), headers=self._JSON_HEADERS) as response:
+                    raise_for_transient(response)
                     if response.status in [200, 204]:
                         logger.info("✓ Discord alert sent")
                     else:
                         logger.error(f"Discord webhook error: {response.status}")
-        
+
+            await call_with_breaker(urlparse(self.discord_webhook).netloc, lambda: retry_async(do_request))
+
+        except CircuitOpen:
+            logger.warning("Discord circuit open, skipping alert")
         except Exception as e:
             logger.error(f"Error sending Discord alert: {e}")
     
@@ -209,20 +334,26 @@ class AlertManager:
                 'severity': severity,
                 'message': message,
                 'transaction_id': transaction_id,
-                'timestamp': asyncio.get_event_loop().time()
+                'timestamp': time.time()
             }
             
-            headers = {}
+            headers = dict(self._JSON_HEADERS)
             if self.webhook_secret:
                 headers['X-Webhook-Secret'] = self.webhook_secret
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.webhook_url, json=payload, headers=headers) as response:
+
+            async def do_request():
+                session = await self._get_session()
+                async with session.post(self.webhook_url, data=orjson.dumps(payload), headers=headers) as response:
+                    raise_for_transient(response)
                     if response.status == 200:
                         logger.info("✓ Custom webhook alert sent")
                     else:
                         logger.error(f"Webhook error: {response.status}")
-        
+
+            await call_with_breaker(urlparse(self.webhook_url).netloc, lambda: retry_async(do_request))
+
+        except CircuitOpen:
+            logger.warning("Custom webhook circuit open, skipping alert")
         except Exception as e:
             logger.error(f"Error sending webhook alert: {e}")
     
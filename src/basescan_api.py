@@ -7,13 +7,27 @@ Interacts with Basescan API for blockchain data
 import logging
 import os
 import asyncio
+import time
 from typing import Dict, List, Optional
+from urllib.parse import urlparse
 import aiohttp
-from dotenv import load_dotenv
+import orjson
+try:
+    from . import config
+except ImportError:
+    import config
+
+try:
+    from ._resilience import retry_async, raise_for_transient, call_with_breaker, CircuitOpen
+except ImportError:
+    from _resilience import retry_async, raise_for_transient, call_with_breaker, CircuitOpen
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Minor-unit scales, computed once instead of 10**N per call
+_WEI = 10 ** 18
+_USDC_SCALE = 10 ** 6
+
 
 class BasescanAPI:
     """
@@ -27,34 +41,121 @@ class BasescanAPI:
         
         if not self.api_key:
             logger.warning("Basescan API key not configured")
-        
+
+        # The key never changes per request; build its params fragment once
+        self._base_params = {'apikey': self.api_key}
+
+        # Shared session against api.basescan.org (created lazily);
+        # keep-alive means repeat requests skip the TCP+TLS handshake
+        self._session = None
+
+        # Real pre-request pacing gate: the old post-return sleep never
+        # ran, so concurrent callers could blow through Basescan's quota
+        # and get throttled
+        self._min_interval = 1.0 / self.rate_limit
+        self._last_request = 0.0
+        self._rate_lock = asyncio.Lock()
+
+        # Circuit breaker key: one breaker per upstream host
+        self._breaker_key = urlparse(self.base_url).netloc
+
+        # Bulkhead: cap in-flight requests so burst callers can't exhaust
+        # the connector pool
+        self._inflight = asyncio.Semaphore(int(os.getenv('BASESCAN_MAX_INFLIGHT', '10')))
+
+        # Response caches — the cheapest request is the one never made.
+        # ABIs are immutable, block-by-timestamp is immutable for past
+        # timestamps, and balances get a ~block-time TTL to collapse
+        # bursts. Entries are (value, expires_at) on time.monotonic().
+        self._abi_cache: Dict[str, List] = {}
+        self._block_ts_cache: Dict[tuple, tuple] = {}
+        self._balance_cache: Dict[tuple, tuple] = {}
+        self._cache_lock = asyncio.Lock()
+        self._balance_ttl = 2.0
+
         logger.info("Basescan API client initialized")
-    
-    async def _make_request(self, params: Dict) -> Dict:
-        """Make API request with rate limiting"""
-        try:
-            # Add API key to params
-            params['apikey'] = self.api_key
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.base_url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('status') == '1':
-                            return data.get('result', {})
-                        else:
-                            logger.error(f"Basescan API error: {data.get('message')}")
-                            return {}
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Create the shared aiohttp session on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=15, connect=3, sock_read=10),
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.rate_limit * 2,
+                    keepalive_timeout=75
+                )
+            )
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _throttle(self):
+        """Wait until the next request slot under the configured rate"""
+        async with self._rate_lock:
+            loop = asyncio.get_running_loop()
+            wait = self._last_request + self._min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_request = loop.time()
+
+    async def _make_request(self, params: Dict, *, expect: type = dict):
+        """
+        Make API request with rate limiting and transient-error retry
+
+        Error paths return expect() — an empty instance of the type the
+        caller iterates — so list-returning endpoints always hand back a
+        list and call sites need no isinstance guard.
+        """
+        # Merge instead of writing the key into the caller's dict
+        merged = {**self._base_params, **params}
+
+        async def do_request():
+            await self._throttle()
+
+            session = await self._ensure_session()
+            async with self._inflight, session.get(self.base_url, params=merged) as response:
+                raise_for_transient(response)
+
+                if response.status == 200:
+                    # orjson parses the body (noticeably faster than
+                    # stdlib json on large tokentx result arrays)
+                    data = orjson.loads(await response.read())
+                    if data.get('status') == '1':
+                        result = data.get('result')
+                        # Several endpoints return plain strings (balances,
+                        # block numbers); only list expectations are enforced
+                        if result is None or (expect is list and not isinstance(result, list)):
+                            return expect()
+                        return result
                     else:
-                        logger.error(f"Basescan HTTP error: {response.status}")
-                        return {}
-            
-            # Rate limiting
-            await asyncio.sleep(1 / self.rate_limit)
-            
+                        logger.error(f"Basescan API error: {data.get('message')}")
+                        return expect()
+                else:
+                    logger.error(f"Basescan HTTP error: {response.status}")
+                    return expect()
+
+        try:
+            # Breaker sits outside the retries so a sustained outage
+            # fails fast instead of burning timeout * retries per call
+            return await call_with_breaker(
+                self._breaker_key, lambda: retry_async(do_request)
+            )
+
+        except CircuitOpen:
+            logger.warning(f"Basescan circuit open, skipping request")
+            return expect()
         except Exception as e:
             logger.error(f"Error making Basescan request: {e}")
-            return {}
+            return expect()
     
     async def get_transaction_details(self, tx_hash: str) -> Dict:
         """Get transaction details"""
@@ -82,6 +183,23 @@ class BasescanAPI:
             logger.error(f"Error getting transaction receipt: {e}")
             return {}
     
+    async def get_tx_details_and_receipt(self, tx_hash: str) -> tuple:
+        """
+        Get transaction details and receipt concurrently
+
+        The two lookups are independent, so firing them together resolves
+        the pair in one round-trip's latency (subject to the rate gate and
+        in-flight bulkhead).
+
+        Returns:
+            (details, receipt) tuple of dicts
+        """
+        details, receipt = await asyncio.gather(
+            self.get_transaction_details(tx_hash),
+            self.get_transaction_receipt(tx_hash)
+        )
+        return details, receipt
+
     async def get_erc20_transfers(self, contract_address: str, address: Optional[str] = None,
                                   start_block: int = 0, end_block: int = 99999999) -> List[Dict]:
         """Get ERC-20 token transfers"""
@@ -97,16 +215,74 @@ class BasescanAPI:
             
             if address:
                 params['address'] = address
-            
-            result = await self._make_request(params)
-            return result if isinstance(result, list) else []
-            
+
+            return await self._make_request(params, expect=list)
+
         except Exception as e:
             logger.error(f"Error getting ERC-20 transfers: {e}")
             return []
     
-    async def get_account_balance(self, address: str) -> float:
-        """Get ETH balance for address"""
+    async def get_erc20_transfers_range(self, contract_address: str, start_block: int,
+                                        end_block: int, step: int = 10000,
+                                        address: Optional[str] = None) -> List[Dict]:
+        """
+        Get ERC-20 transfers over a block range by scanning chunks in parallel
+
+        Splits the range into step-sized windows and fetches them with
+        asyncio.gather; the in-flight semaphore and rate gate keep the
+        fan-out within Basescan's limits.
+
+        Args:
+            contract_address: Token contract address
+            start_block: First block (inclusive)
+            end_block: Last block (inclusive)
+            step: Blocks per window
+            address: Optional address filter
+
+        Returns:
+            Combined transfer list across all windows
+        """
+        try:
+            results = await asyncio.gather(*[
+                self.get_erc20_transfers(
+                    contract_address,
+                    address=address,
+                    start_block=s,
+                    end_block=min(s + step - 1, end_block)
+                )
+                for s in range(start_block, end_block + 1, step)
+            ])
+
+            transfers = []
+            for chunk in results:
+                transfers.extend(chunk)
+            return transfers
+
+        except Exception as e:
+            logger.error(f"Error getting ERC-20 transfers for range: {e}")
+            return []
+
+    async def _cached_balance(self, key: tuple, params: Dict) -> int:
+        """Look up a cached minor-unit balance, fetching on miss or expiry"""
+        async with self._cache_lock:
+            cached = self._balance_cache.get(key)
+            if cached is not None and time.monotonic() < cached[1]:
+                return cached[0]
+
+        result = await self._make_request(params)
+        balance = int(result) if result else 0
+
+        async with self._cache_lock:
+            self._balance_cache[key] = (balance, time.monotonic() + self._balance_ttl)
+        return balance
+
+    async def get_account_balance(self, address: str) -> int:
+        """
+        Get ETH balance for address in wei (cached for ~one block)
+
+        Returned as an exact integer — dividing by _WEI at the UI edge is
+        up to the caller, since float loses precision on large balances.
+        """
         try:
             params = {
                 'module': 'account',
@@ -114,20 +290,19 @@ class BasescanAPI:
                 'address': address,
                 'tag': 'latest'
             }
-            
-            result = await self._make_request(params)
-            
-            if result:
-                balance_wei = int(result)
-                return balance_wei / 10**18
-            return 0.0
-            
+            return await self._cached_balance(('eth', address.lower()), params)
+
         except Exception as e:
             logger.error(f"Error getting account balance: {e}")
-            return 0.0
-    
-    async def get_token_balance(self, token_address: str, wallet_address: str) -> float:
-        """Get ERC-20 token balance"""
+            return 0
+
+    async def get_token_balance(self, token_address: str, wallet_address: str) -> int:
+        """
+        Get ERC-20 token balance in minor units (cached for ~one block)
+
+        For USDC this is micro-USDC (6 decimals); divide by _USDC_SCALE
+        only when formatting for display.
+        """
         try:
             params = {
                 'module': 'account',
@@ -136,48 +311,72 @@ class BasescanAPI:
                 'address': wallet_address,
                 'tag': 'latest'
             }
-            
-            result = await self._make_request(params)
-            
-            if result:
-                # USDC has 6 decimals
-                balance_raw = int(result)
-                return balance_raw / 10**6
-            return 0.0
-            
+            return await self._cached_balance(
+                ('token', token_address.lower(), wallet_address.lower()), params
+            )
+
         except Exception as e:
             logger.error(f"Error getting token balance: {e}")
-            return 0.0
-    
+            return 0
+
     async def get_contract_abi(self, contract_address: str) -> List[Dict]:
-        """Get contract ABI"""
+        """Get contract ABI (cached forever — ABIs of deployed contracts are immutable)"""
         try:
+            key = contract_address.lower()
+            async with self._cache_lock:
+                if key in self._abi_cache:
+                    return self._abi_cache[key]
+
             params = {
                 'module': 'contract',
                 'action': 'getabi',
                 'address': contract_address
             }
-            
-            result = await self._make_request(params)
-            return result if isinstance(result, list) else []
-            
+
+            abi = await self._make_request(params, expect=list)
+
+            if abi:
+                async with self._cache_lock:
+                    self._abi_cache[key] = abi
+            return abi
+
         except Exception as e:
             logger.error(f"Error getting contract ABI: {e}")
             return []
-    
+
     async def get_block_number_by_timestamp(self, timestamp: int, closest: str = 'before') -> int:
-        """Get block number by timestamp"""
+        """
+        Get block number by timestamp
+
+        Cached: permanently for timestamps more than an hour in the past
+        (the answer can never change), 5 minutes otherwise.
+        """
         try:
+            key = (timestamp, closest)
+            async with self._cache_lock:
+                cached = self._block_ts_cache.get(key)
+                if cached is not None and time.monotonic() < cached[1]:
+                    return cached[0]
+
             params = {
                 'module': 'block',
                 'action': 'getblocknobytime',
                 'timestamp': timestamp,
                 'closest': closest
             }
-            
+
             result = await self._make_request(params)
-            return int(result) if result else 0
-            
+            block_number = int(result) if result else 0
+
+            if block_number:
+                if timestamp < time.time() - 3600:
+                    expires_at = float('inf')
+                else:
+                    expires_at = time.monotonic() + 300.0
+                async with self._cache_lock:
+                    self._block_ts_cache[key] = (block_number, expires_at)
+            return block_number
+
         except Exception as e:
             logger.error(f"Error getting block by timestamp: {e}")
             return 0
\ No newline at end of file
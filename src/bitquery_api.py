@@ -4,15 +4,201 @@ Bitquery GraphQL API Client
 Interacts with Bitquery for advanced blockchain analytics
 """
 
+import asyncio
 import logging
 import os
 from typing import Dict, List, Optional
+from urllib.parse import urlparse
 import aiohttp
-from dotenv import load_dotenv
+import orjson
+try:
+    from . import config
+except ImportError:
+    import config
+
+try:
+    from ._resilience import retry_async, raise_for_transient, call_with_breaker, CircuitOpen
+except ImportError:
+    from _resilience import retry_async, raise_for_transient, call_with_breaker, CircuitOpen
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Queries are module-level constants taking GraphQL variables instead of
+# f-string interpolation: the query text never changes between calls, so
+# Bitquery's server-side query cache can hit, and values can't inject
+# into the query itself.
+#
+# The transfers query comes in four shapes (sender/receiver filters are
+# structural, not nullable values), keyed by which filters are present.
+_TRANSFERS_FIELDS = """
+                  block {
+                    height
+                    timestamp {
+                      unixtime
+                    }
+                  }
+                  transaction {
+                    hash
+                    gasValue
+                    gasPrice
+                  }
+                  sender {
+                    address
+                  }
+                  receiver {
+                    address
+                  }
+                  amount
+                  currency {
+                    symbol
+                    decimals
+                  }
+"""
+
+_TRANSFERS_QUERIES = {
+    (has_from, has_to): """
+            query ($network: EthereumNetwork!, $token: String!, $limit: Int!%s) {
+              ethereum(network: $network) {
+                transfers(
+                  currency: {is: $token}
+                  %s
+                  options: {limit: $limit, desc: "block.height"}
+                ) {
+%s
+                }
+              }
+            }
+            """ % (
+        (', $from: String!' if has_from else '') + (', $to: String!' if has_to else ''),
+        ('sender: {is: $from}\n                  ' if has_from else '')
+        + ('receiver: {is: $to}' if has_to else ''),
+        _TRANSFERS_FIELDS
+    )
+    for has_from in (False, True)
+    for has_to in (False, True)
+}
+
+_ADDRESS_STATS_QUERY = """
+            query ($network: EthereumNetwork!, $token: String!, $address: String!) {
+              ethereum(network: $network) {
+                transfers(
+                  currency: {is: $token}
+                  any: [{
+                    sender: {is: $address}
+                  }, {
+                    receiver: {is: $address}
+                  }]
+                ) {
+                  count
+                  amount(calculate: sum)
+                  sender {
+                    address
+                  }
+                  receiver {
+                    address
+                  }
+                }
+              }
+            }
+            """
+
+_TOKEN_HOLDERS_QUERY = """
+            query ($network: EthereumNetwork!, $token: String!, $limit: Int!) {
+              ethereum(network: $network) {
+                address(
+                  address: {is: $token}
+                ) {
+                  balances(
+                    currency: {is: $token}
+                    options: {limit: $limit, desc: "value"}
+                  ) {
+                    address {
+                      address
+                    }
+                    value
+                  }
+                }
+              }
+            }
+            """
+
+_TOKEN_BUNDLE_QUERY = """
+            query ($network: EthereumNetwork!, $token: String!, $address: String!, $limit: Int!) {
+              ethereum(network: $network) {
+                transfers: transfers(
+                  currency: {is: $token}
+                  options: {limit: $limit, desc: "block.height"}
+                ) {
+%s
+                }
+                stats: transfers(
+                  currency: {is: $token}
+                  any: [{
+                    sender: {is: $address}
+                  }, {
+                    receiver: {is: $address}
+                  }]
+                ) {
+                  count
+                  amount(calculate: sum)
+                }
+                holders: address(
+                  address: {is: $token}
+                ) {
+                  balances(
+                    currency: {is: $token}
+                    options: {limit: $limit, desc: "value"}
+                  ) {
+                    address {
+                      address
+                    }
+                    value
+                  }
+                }
+              }
+            }
+            """ % _TRANSFERS_FIELDS
+
+_DEX_TRADES_QUERY = """
+            query ($network: EthereumNetwork!, $token: String!, $limit: Int!) {
+              ethereum(network: $network) {
+                dexTrades(
+                  baseCurrency: {is: $token}
+                  options: {limit: $limit, desc: "block.height"}
+                ) {
+                  block {
+                    height
+                    timestamp {
+                      unixtime
+                    }
+                  }
+                  transaction {
+                    hash
+                  }
+                  smartContract {
+                    address {
+                      address
+                    }
+                  }
+                  baseAmount
+                  quoteAmount
+                  baseCurrency {
+                    symbol
+                  }
+                  quoteCurrency {
+                    symbol
+                  }
+                  buyer {
+                    address
+                  }
+                  seller {
+                    address
+                  }
+                }
+              }
+            }
+            """
+
 
 class BitqueryAPI:
     """
@@ -26,33 +212,87 @@ class BitqueryAPI:
         
         if not self.api_key:
             logger.warning("Bitquery API key not configured")
-        
+
+        # Headers never change per query; build them once
+        self._headers = {
+            'X-API-KEY': self.api_key,
+            'Content-Type': 'application/json'
+        }
+
+        # Shared session to the GraphQL endpoint (created lazily) so
+        # back-to-back queries reuse one TLS connection
+        self._session = None
+
+        # Circuit breaker key: one breaker per upstream host
+        self._breaker_key = urlparse(self.endpoint).netloc
+
+        # Bulkhead: cap in-flight queries so burst callers can't exhaust
+        # the connector pool
+        self._inflight = asyncio.Semaphore(int(os.getenv('BITQUERY_MAX_INFLIGHT', '10')))
+
         logger.info("Bitquery API client initialized")
-    
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Create the shared aiohttp session on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                # GraphQL queries are heavier than REST lookups, so allow
+                # a longer total deadline
+                timeout=aiohttp.ClientTimeout(total=30, connect=3),
+                connector=aiohttp.TCPConnector(
+                    limit=20,
+                    ttl_dns_cache=300,
+                    enable_cleanup_closed=True
+                )
+            )
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
     async def _execute_query(self, query: str, variables: Dict = None) -> Dict:
-        """Execute GraphQL query"""
-        try:
-            headers = {
-                'X-API-KEY': self.api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {'query': query}
-            if variables:
-                payload['variables'] = variables
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.endpoint, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if 'errors' in data:
-                            logger.error(f"Bitquery GraphQL errors: {data['errors']}")
-                            return {}
-                        return data.get('data', {})
-                    else:
-                        logger.error(f"Bitquery HTTP error: {response.status}")
+        """Execute GraphQL query with transient-error retry"""
+        payload = {'query': query}
+        if variables:
+            payload['variables'] = variables
+
+        # orjson encodes/decodes GraphQL payloads (C implementation —
+        # the transfer/trade responses can be large nested arrays)
+        body = orjson.dumps(payload)
+
+        async def do_request():
+            session = await self._get_session()
+            async with self._inflight, session.post(self.endpoint, data=body, headers=self._headers) as response:
+                raise_for_transient(response)
+
+                if response.status == 200:
+                    data = orjson.loads(await response.read())
+                    if 'errors' in data:
+                        logger.error(f"Bitquery GraphQL errors: {data['errors']}")
                         return {}
-        
+                    return data.get('data', {})
+                else:
+                    logger.error(f"Bitquery HTTP error: {response.status}")
+                    return {}
+
+        try:
+            # Breaker sits outside the retries so a sustained outage
+            # fails fast instead of waiting through every retry
+            return await call_with_breaker(
+                self._breaker_key, lambda: retry_async(do_request)
+            )
+
+        except CircuitOpen:
+            logger.warning("Bitquery circuit open, skipping query")
+            return {}
         except Exception as e:
             logger.error(f"Error executing Bitquery query: {e}")
             return {}
@@ -62,51 +302,19 @@ class BitqueryAPI:
                                  to_address: Optional[str] = None) -> List[Dict]:
         """Get token transfers"""
         try:
-            # Build filter conditions
-            filters = []
+            query = _TRANSFERS_QUERIES[(bool(from_address), bool(to_address))]
+
+            variables = {
+                'network': self.network,
+                'token': token_address,
+                'limit': limit
+            }
             if from_address:
-                filters.append(f'sender: {{is: "{from_address}"}}')
+                variables['from'] = from_address
             if to_address:
-                filters.append(f'receiver: {{is: "{to_address}"}}')
-            
-            filter_str = ', '.join(filters) if filters else ''
-            
-            query = f"""
-            {{
-              ethereum(network: {self.network}) {{
-                transfers(
-                  currency: {{is: "{token_address}"}}
-                  {filter_str}
-                  options: {{limit: {limit}, desc: "block.height"}}
-                ) {{
-                  block {{
-                    height
-                    timestamp {{
-                      unixtime
-                    }}
-                  }}
-                  transaction {{
-                    hash
-                    gasValue
-                    gasPrice
-                  }}
-                  sender {{
-                    address
-                  }}
-                  receiver {{
-                    address
-                  }}
-                  amount
-                  currency {{
-                    symbol
-                    decimals
-                  }}
-                }}
-              }}
-            }}
-            """
-            
-            result = await self._execute_query(query)
+                variables['to'] = to_address
+
+            result = await self._execute_query(query, variables)
             
             if result and 'ethereum' in result:
                 return result['ethereum'].get('transfers', [])
@@ -119,31 +327,11 @@ class BitqueryAPI:
     async def get_address_statistics(self, address: str, token_address: str) -> Dict:
         """Get statistics for an address"""
         try:
-            query = f"""
-            {{
-              ethereum(network: {self.network}) {{
-                transfers(
-                  currency: {{is: "{token_address}"}}
-                  any: [{{
-                    sender: {{is: "{address}"}}
-                  }}, {{
-                    receiver: {{is: "{address}"}}
-                  }}]
-                ) {{
-                  count
-                  amount(calculate: sum)
-                  sender {{
-                    address
-                  }}
-                  receiver {{
-                    address
-                  }}
-                }}
-              }}
-            }}
-            """
-            
-            result = await self._execute_query(query)
+            result = await self._execute_query(_ADDRESS_STATS_QUERY, {
+                'network': self.network,
+                'token': token_address,
+                'address': address
+            })
             
             if result and 'ethereum' in result:
                 return result['ethereum'].get('transfers', [{}])[0] if result['ethereum'].get('transfers') else {}
@@ -156,27 +344,11 @@ class BitqueryAPI:
     async def get_token_holders(self, token_address: str, limit: int = 100) -> List[Dict]:
         """Get top token holders"""
         try:
-            query = f"""
-            {{
-              ethereum(network: {self.network}) {{
-                address(
-                  address: {{is: "{token_address}"}}
-                ) {{
-                  balances(
-                    currency: {{is: "{token_address}"}}
-                    options: {{limit: {limit}, desc: "value"}}
-                  ) {{
-                    address {{
-                      address
-                    }}
-                    value
-                  }}
-                }}
-              }}
-            }}
-            """
-            
-            result = await self._execute_query(query)
+            result = await self._execute_query(_TOKEN_HOLDERS_QUERY, {
+                'network': self.network,
+                'token': token_address,
+                'limit': limit
+            })
             
             if result and 'ethereum' in result:
                 addresses = result['ethereum'].get('address', [])
@@ -188,50 +360,53 @@ class BitqueryAPI:
             logger.error(f"Error getting token holders: {e}")
             return []
     
+    async def get_token_bundle(self, token_address: str, address: str,
+                               limit: int = 100) -> Dict:
+        """
+        Get transfers, address statistics and top holders in one request
+
+        GraphQL aliases merge the three queries into a single POST, so a
+        per-token refresh costs one round-trip to Bitquery instead of
+        three sequential ones.
+
+        Args:
+            token_address: Token contract address
+            address: Address for the statistics slice
+            limit: Row limit for the transfers and holders slices
+
+        Returns:
+            Dict with 'transfers', 'stats' and 'holders' keys
+        """
+        try:
+            result = await self._execute_query(_TOKEN_BUNDLE_QUERY, {
+                'network': self.network,
+                'token': token_address,
+                'address': address,
+                'limit': limit
+            })
+
+            ethereum = result.get('ethereum') or {}
+            stats = ethereum.get('stats') or [{}]
+            holders = ethereum.get('holders') or []
+
+            return {
+                'transfers': ethereum.get('transfers', []),
+                'stats': stats[0] if stats else {},
+                'holders': holders[0].get('balances', []) if holders else []
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting token bundle: {e}")
+            return {'transfers': [], 'stats': {}, 'holders': []}
+
     async def get_dex_trades(self, token_address: str, limit: int = 100) -> List[Dict]:
         """Get DEX trades for a token"""
         try:
-            query = f"""
-            {{
-              ethereum(network: {self.network}) {{
-                dexTrades(
-                  baseCurrency: {{is: "{token_address}"}}
-                  options: {{limit: {limit}, desc: "block.height"}}
-                ) {{
-                  block {{
-                    height
-                    timestamp {{
-                      unixtime
-                    }}
-                  }}
-                  transaction {{
-                    hash
-                  }}
-                  smartContract {{
-                    address {{
-                      address
-                    }}
-                  }}
-                  baseAmount
-                  quoteAmount
-                  baseCurrency {{
-                    symbol
-                  }}
-                  quoteCurrency {{
-                    symbol
-                  }}
-                  buyer {{
-                    address
-                  }}
-                  seller {{
-                    address
-                  }}
-                }}
-              }}
-            }}
-            """
-            
-            result = await self._execute_query(query)
+            result = await self._execute_query(_DEX_TRADES_QUERY, {
+                'network': self.network,
+                'token': token_address,
+                'limit': limit
+            })
             
             if result and 'ethereum' in result:
                 return result['ethereum'].get('dexTrades', [])
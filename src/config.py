@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Central Configuration Loader
+Parses the .env file exactly once per process
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Importing this module anywhere guarantees .env has been loaded, without
+# each sibling module re-parsing the file at import time. The sentinel
+# makes repeat imports (and stray load_dotenv calls) no-ops.
+if os.getenv('_DOTENV_LOADED') != '1':
+    load_dotenv()
+    os.environ['_DOTENV_LOADED'] = '1'
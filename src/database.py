@@ -4,16 +4,42 @@ Supabase Database Manager
 Handles all database operations for storing transactions and alerts
 """
 
+import asyncio
 import logging
 import os
 from typing import Dict, List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from decimal import Decimal
+import httpx
 from supabase import create_client, Client
-from dotenv import load_dotenv
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+try:
+    from . import config
+except ImportError:
+    import config
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Process-wide manager instance (see get_database)
+_database = None
+
+
+def get_database() -> 'SupabaseManager':
+    """
+    Return the shared SupabaseManager, creating it on first use
+
+    Client construction performs auth/session setup, so callers inside one
+    asyncio.run graph should share a single instance instead of building
+    their own.
+    """
+    global _database
+    if _database is None:
+        _database = SupabaseManager()
+    return _database
+
 
 class SupabaseManager:
     """
@@ -29,14 +55,100 @@ class SupabaseManager:
         if not self.url or not self.key:
             logger.error("Supabase credentials not configured")
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+
+        # Optional direct Postgres connection for the bulk-insert path.
+        # PostgREST pays HTTP+JSON per request; asyncpg speaks the binary
+        # wire protocol, which is several times faster for bulk ingest.
+        # Read paths stay on PostgREST.
+        self.pg_url = os.getenv('POSTGRES_URL')
+        self._pg_pool = None
         
         try:
             self.client: Client = create_client(self.url, self.key)
+
+            # Swap the PostgREST transport for one with explicit keep-alive
+            # pooling so repeated queries reuse warm TLS connections
+            # instead of paying connection setup per request
+            old_session = self.client.postgrest.session
+            self.client.postgrest.session = httpx.Client(
+                base_url=old_session.base_url,
+                headers=old_session.headers,
+                timeout=old_session.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+            old_session.close()
+
             logger.info("✓ Connected to Supabase")
         except Exception as e:
             logger.error(f"Failed to connect to Supabase: {e}")
             raise
     
+    @staticmethod
+    async def _run(query):
+        """
+        Execute a built PostgREST query in a worker thread
+
+        supabase-py performs blocking HTTP; running .execute() through
+        asyncio.to_thread keeps database round-trips from stalling every
+        other task on the event loop.
+        """
+        return await asyncio.to_thread(query.execute)
+
+    async def _get_pg_pool(self):
+        """
+        Lazily create the asyncpg pool for direct bulk inserts
+
+        Returns None when POSTGRES_URL is unset or asyncpg is not
+        installed, in which case callers fall back to PostgREST.
+        statement_cache_size=0 keeps the pool compatible with Supabase's
+        Supavisor transaction-mode pooler.
+        """
+        if not self.pg_url or asyncpg is None:
+            return None
+
+        if self._pg_pool is None:
+            self._pg_pool = await asyncpg.create_pool(
+                self.pg_url, min_size=2, max_size=5, statement_cache_size=0
+            )
+            logger.info("✓ Connected to Postgres directly for bulk inserts")
+        return self._pg_pool
+
+    _TX_INSERT_SQL = (
+        "INSERT INTO {table} (tx_hash, block_number, timestamp, from_address, "
+        "to_address, amount, gas_used, gas_price, status, is_flagged, pattern_score) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11) "
+        "ON CONFLICT (tx_hash) DO NOTHING"
+    )
+
+    @staticmethod
+    def _tx_row(tx: Dict) -> tuple:
+        """Convert a transaction dict to an asyncpg parameter tuple"""
+        timestamp = tx.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        elif timestamp is None:
+            timestamp = datetime.now()
+
+        # The transactions column is TIMESTAMP without time zone, and
+        # asyncpg refuses aware datetimes against it — normalize aware
+        # inputs (backfill uses UTC ISO strings) to naive UTC
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+        return (
+            tx.get('tx_hash'),
+            tx.get('block_number'),
+            timestamp,
+            tx.get('from_address'),
+            tx.get('to_address'),
+            Decimal(str(tx.get('amount', 0))),
+            tx.get('gas_used'),
+            Decimal(str(tx.get('gas_price', 0) or 0)),
+            tx.get('status', 'confirmed'),
+            tx.get('is_flagged', False),
+            Decimal(str(tx.get('pattern_score', 0)))
+        )
+
     async def insert_transaction(self, transaction: Dict) -> Dict:
         """
         Insert a new transaction record
@@ -63,16 +175,87 @@ class SupabaseManager:
                 'pattern_score': float(transaction.get('pattern_score', 0))
             }
             
-            # Insert into database
-            result = self.client.table(self.table_transactions).insert(data).execute()
-            
-            logger.info(f"✓ Transaction saved to database: {transaction.get('tx_hash')}")
+            # Upsert so replays of an already-seen hash are dropped by the
+            # UNIQUE(tx_hash) constraint instead of erroring
+            result = await self._run(self.client.table(self.table_transactions).upsert(
+                data, on_conflict='tx_hash', ignore_duplicates=True
+            ))
+
+            logger.info("✓ Transaction saved to database: %s", transaction.get('tx_hash'))
             return result.data[0] if result.data else {}
             
         except Exception as e:
-            logger.error(f"Error inserting transaction: {e}", exc_info=True)
+            logger.error("Error inserting transaction: %s", e)
             return {}
     
+    async def insert_transactions(self, transactions: List[Dict], chunk_size: int = 500) -> List[Dict]:
+        """
+        Bulk-insert transaction records in a single request per chunk
+
+        When POSTGRES_URL is configured the batch goes straight to
+        Postgres over asyncpg's binary protocol (executemany pipelines
+        all rows in one round-trip); otherwise it falls back to PostgREST,
+        where inserting N records still costs one HTTP round-trip per
+        chunk instead of N. Either way, rows whose tx_hash already exists
+        are silently skipped (ON CONFLICT DO NOTHING), making Postgres
+        the source of truth for deduplication.
+
+        Args:
+            transactions: List of transaction data dictionaries
+            chunk_size: Maximum rows per PostgREST insert request
+
+        Returns:
+            List of inserted records (empty on the asyncpg path, which
+            does not return rows)
+        """
+        if not transactions:
+            return []
+
+        pool = await self._get_pg_pool()
+        if pool is not None:
+            try:
+                rows = [self._tx_row(tx) for tx in transactions]
+                sql = self._TX_INSERT_SQL.format(table=self.table_transactions)
+                async with pool.acquire() as conn:
+                    await conn.executemany(sql, rows)
+                logger.info("✓ Bulk-inserted %d transactions via asyncpg", len(rows))
+                return []
+            except Exception as e:
+                logger.error("asyncpg bulk insert failed, falling back to PostgREST: %s", e)
+
+        inserted = []
+        try:
+            for i in range(0, len(transactions), chunk_size):
+                chunk = transactions[i:i + chunk_size]
+                data = [
+                    {
+                        'tx_hash': tx.get('tx_hash'),
+                        'block_number': tx.get('block_number'),
+                        'timestamp': tx.get('timestamp', datetime.now().isoformat()),
+                        'from_address': tx.get('from_address'),
+                        'to_address': tx.get('to_address'),
+                        'amount': float(tx.get('amount', 0)),
+                        'gas_used': tx.get('gas_used'),
+                        'gas_price': str(tx.get('gas_price', 0)),
+                        'status': tx.get('status', 'confirmed'),
+                        'is_flagged': tx.get('is_flagged', False),
+                        'pattern_score': float(tx.get('pattern_score', 0))
+                    }
+                    for tx in chunk
+                ]
+
+                result = await self._run(self.client.table(self.table_transactions).upsert(
+                    data, on_conflict='tx_hash', ignore_duplicates=True
+                ))
+                inserted.extend(result.data or [])
+
+            logger.info("✓ Bulk-inserted %d transactions", len(inserted))
+            return inserted
+
+        except Exception as e:
+            logger.error("Error bulk-inserting transactions: %s", e)
+            return inserted
+
     async def insert_alert(self, alert: Dict) -> Dict:
         """
         Insert a new alert record
@@ -93,19 +276,54 @@ class SupabaseManager:
                 'channels': alert.get('channels', [])
             }
             
-            result = self.client.table(self.table_alerts).insert(data).execute()
+            result = await self._run(self.client.table(self.table_alerts).insert(data))
             
-            logger.debug(f"✓ Alert saved to database")
+            logger.debug("✓ Alert saved to database")
             return result.data[0] if result.data else {}
             
         except Exception as e:
             logger.error(f"Error inserting alert: {e}")
             return {}
     
+    async def insert_alerts(self, alerts: List[Dict]) -> List[Dict]:
+        """
+        Bulk-insert alert records in a single request
+
+        Args:
+            alerts: List of alert data dictionaries
+
+        Returns:
+            List of inserted records
+        """
+        if not alerts:
+            return []
+
+        try:
+            data = [
+                {
+                    'transaction_id': alert.get('transaction_id'),
+                    'alert_type': alert.get('alert_type'),
+                    'severity': alert.get('severity'),
+                    'message': alert.get('message'),
+                    'sent_at': datetime.now().isoformat(),
+                    'channels': alert.get('channels', [])
+                }
+                for alert in alerts
+            ]
+
+            result = await self._run(self.client.table(self.table_alerts).insert(data))
+
+            logger.debug("✓ Bulk-inserted %d alerts", len(result.data or []))
+            return result.data or []
+
+        except Exception as e:
+            logger.error(f"Error bulk-inserting alerts: {e}")
+            return []
+
     async def get_transaction(self, tx_hash: str) -> Optional[Dict]:
         """Get transaction by hash"""
         try:
-            result = self.client.table(self.table_transactions).select("*").eq('tx_hash', tx_hash).execute()
+            result = await self._run(self.client.table(self.table_transactions).select("*").eq('tx_hash', tx_hash))
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error getting transaction: {e}")
@@ -114,16 +332,48 @@ class SupabaseManager:
     async def get_recent_transactions(self, limit: int = 100) -> List[Dict]:
         """Get recent transactions"""
         try:
-            result = self.client.table(self.table_transactions).select("*").order('timestamp', desc=True).limit(limit).execute()
+            result = await self._run(self.client.table(self.table_transactions).select("*").order('timestamp', desc=True).limit(limit))
             return result.data
         except Exception as e:
             logger.error(f"Error getting recent transactions: {e}")
             return []
     
+    async def iter_recent_transactions(self, page_size: int = 1000):
+        """
+        Iterate recent transactions page by page
+
+        Async generator that fetches one page per request, so callers can
+        stream arbitrarily large exports with constant memory.
+
+        Args:
+            page_size: Number of rows per page
+
+        Yields:
+            Transaction records, newest first
+        """
+        offset = 0
+        while True:
+            try:
+                result = await self._run(self.client.table(self.table_transactions).select("*").order('timestamp', desc=True).range(offset, offset + page_size - 1))
+            except Exception as e:
+                logger.error(f"Error iterating transactions at offset {offset}: {e}")
+                return
+
+            if not result.data:
+                return
+
+            for record in result.data:
+                yield record
+
+            if len(result.data) < page_size:
+                return
+
+            offset += page_size
+
     async def get_flagged_transactions(self, limit: int = 50) -> List[Dict]:
         """Get flagged transactions"""
         try:
-            result = self.client.table(self.table_transactions).select("*").eq('is_flagged', True).order('timestamp', desc=True).limit(limit).execute()
+            result = await self._run(self.client.table(self.table_transactions).select("*").eq('is_flagged', True).order('timestamp', desc=True).limit(limit))
             return result.data
         except Exception as e:
             logger.error(f"Error getting flagged transactions: {e}")
@@ -132,8 +382,11 @@ class SupabaseManager:
     async def get_transactions_by_address(self, address: str, limit: int = 100) -> List[Dict]:
         """Get transactions for a specific address"""
         try:
-            # Query for both from and to addresses
-            result = self.client.table(self.table_transactions).select("*").or_(f"from_address.eq.{address},to_address.eq.{address}").order('timestamp', desc=True).limit(limit).execute()
+            # The txs_by_address function (see scripts/database_schema.sql)
+            # runs a UNION ALL of two indexed equality lookups instead of an
+            # OR across from_address/to_address, which Postgres can't serve
+            # from a single index
+            result = await self._run(self.client.rpc('txs_by_address', {'addr': address, 'lim': limit}))
             return result.data
         except Exception as e:
             logger.error(f"Error getting transactions for address: {e}")
@@ -145,7 +398,7 @@ class SupabaseManager:
             min_amount = amount - tolerance
             max_amount = amount + tolerance
             
-            result = self.client.table(self.table_transactions).select("*").gte('amount', min_amount).lte('amount', max_amount).order('timestamp', desc=True).limit(limit).execute()
+            result = await self._run(self.client.table(self.table_transactions).select("*").gte('amount', min_amount).lte('amount', max_amount).order('timestamp', desc=True).limit(limit))
             return result.data
         except Exception as e:
             logger.error(f"Error getting transactions by amount: {e}")
@@ -154,7 +407,7 @@ class SupabaseManager:
     async def get_alerts(self, limit: int = 100) -> List[Dict]:
         """Get recent alerts"""
         try:
-            result = self.client.table(self.table_alerts).select("*").order('sent_at', desc=True).limit(limit).execute()
+            result = await self._run(self.client.table(self.table_alerts).select("*").order('sent_at', desc=True).limit(limit))
             return result.data
         except Exception as e:
             logger.error(f"Error getting alerts: {e}")
@@ -163,24 +416,17 @@ class SupabaseManager:
     async def get_statistics(self) -> Dict:
         """Get database statistics"""
         try:
-            # Count total transactions
-            total_txs = self.client.table(self.table_transactions).select('id', count='exact').execute()
-            
-            # Count flagged transactions
-            flagged_txs = self.client.table(self.table_transactions).select('id', count='exact').eq('is_flagged', True).execute()
-            
-            # Count alerts
-            total_alerts = self.client.table(self.table_alerts).select('id', count='exact').execute()
-            
-            return {
-                'total_transactions': total_txs.count,
-                'flagged_transactions': flagged_txs.count,
-                'total_alerts': total_alerts.count
-            }
+            # monitor_stats (see scripts/database_schema.sql) returns all
+            # three counts in one round-trip instead of three count queries
+            result = await self._run(self.client.rpc('monitor_stats'))
+            return result.data[0] if result.data else {}
         except Exception as e:
             logger.error(f"Error getting statistics: {e}")
             return {}
     
     async def close(self):
         """Close database connection"""
+        if self._pg_pool is not None:
+            await self._pg_pool.close()
+            self._pg_pool = None
         logger.info("Closing database connection")
\ No newline at end of file
@@ -8,10 +8,15 @@ import asyncio
 import logging
 import signal
 import sys
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from dotenv import load_dotenv
+try:
+    from . import config
+except ImportError:
+    import config
 import os
 
 from rpc_connector import BaseRPCConnector
@@ -22,8 +27,6 @@ from database import SupabaseManager
 from basescan_api import BasescanAPI
 from bitquery_api import BitqueryAPI
 
-# Load environment variables
-load_dotenv()
 
 # Configure logging
 logging.basicConfig(
@@ -41,7 +44,15 @@ class USDCMonitor:
     """
     Main monitoring class that orchestrates all components
     """
-    
+
+    # Transfers above this many USDC trigger a large-transfer alert
+    LARGE_TRANSFER_USDC = 10_000
+
+    # Enrichment cache bounds: entries expire after an hour and the
+    # oldest are evicted past 10k hashes
+    ENRICH_CACHE_TTL = 3600
+    ENRICH_CACHE_MAX = 10_000
+
     def __init__(self):
         logger.info("Initializing USDC Monitor...")
         
@@ -54,16 +65,46 @@ class USDCMonitor:
         self.basescan = BasescanAPI()
         self.bitquery = BitqueryAPI()
         
-        # Configuration
+        # Configuration — read once; these sit on per-transfer hot paths
         self.target_amount = float(os.getenv('TARGET_AMOUNT', '100'))
+        # Target matching runs on integer base units (micro-USDC), so the
+        # per-transfer check is exact arithmetic on amountRaw instead of
+        # a float epsilon; tolerance stays the established ±0.01 USDC
+        self._usdc_scale = 10 ** self.tracker.usdc_decimals
+        self._target_amount_raw = round(self.target_amount * self._usdc_scale)
+        self._amount_raw_tolerance = self._usdc_scale // 100
         self.poll_interval = int(os.getenv('POLL_INTERVAL', '12'))
-        self.monitor_addresses = os.getenv('MONITOR_ADDRESSES', '').split(',')
-        self.monitor_addresses = [addr.strip() for addr in self.monitor_addresses if addr.strip()]
+        self.pattern_enabled = os.getenv('PATTERN_DETECTION_ENABLED', 'true').lower() == 'true'
+        self.anomaly_threshold = float(os.getenv('ANOMALY_THRESHOLD', '0.85'))
+        # Frozenset of lowercased addresses: O(1) membership, and EVM
+        # addresses compare reliably regardless of checksum casing
+        self.monitor_addresses = frozenset(
+            addr.strip().lower()
+            for addr in os.getenv('MONITOR_ADDRESSES', '').split(',')
+            if addr.strip()
+        )
         
         # State
         self.is_running = False
         self.last_block = None
-        self.transaction_cache = set()
+        self._monitor_task: Optional[asyncio.Task] = None
+
+        # Bound concurrent per-transfer enrichment so a busy window can't
+        # flood the RPC and Basescan clients all at once
+        self.enrich_concurrency = int(os.getenv('ENRICH_CONCURRENCY', '8'))
+        self._enrich_sem = asyncio.Semaphore(self.enrich_concurrency)
+
+        # Bounded TTL cache of (tx_details, basescan_data) keyed by
+        # tx_hash, so a transfer re-seen across overlapping windows or a
+        # reorg doesn't pay the RPC/Basescan round-trips twice
+        self._enrich_cache = OrderedDict()
+
+        # Pipeline queues: raw transfers -> enriched records -> persistence.
+        # Bounded so a slow stage applies backpressure instead of buffering
+        # without limit (created per run in _monitor_loop)
+        self._transfer_q: Optional[asyncio.Queue] = None
+        self._enriched_q: Optional[asyncio.Queue] = None
+        self._persist_q: Optional[asyncio.Queue] = None
         
         logger.info(f"Monitor initialized. Tracking {len(self.monitor_addresses)} addresses")
         logger.info(f"Target amount: {self.target_amount} USDC")
@@ -81,84 +122,186 @@ class USDCMonitor:
             # Get initial block
             self.last_block = await self.rpc.get_latest_block_number()
             logger.info(f"Starting from block: {self.last_block}")
-            
-            # Start monitoring loop
-            await self._monitor_loop()
-            
+
+            # Run the loop as a task so stop() can cancel it out of the
+            # blocking subscription iterator
+            self._monitor_task = asyncio.create_task(self._monitor_loop())
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                logger.info("Monitor loop cancelled")
+
         except Exception as e:
             logger.error(f"Fatal error in monitor: {e}", exc_info=True)
-            await self.stop()
+        finally:
+            # Clients are closed only after the loop task has unwound, so
+            # shutdown can't race code that is still using them
+            await self._close_clients()
     
     async def _monitor_loop(self):
-        """Main monitoring loop"""
+        """
+        Main monitoring loop
+
+        The node pushes matching transfers over the eth_subscribe
+        WebSocket; from there the work flows through a three-stage
+        pipeline — enrichment workers, a batch analyzer, and a batching
+        persister — connected by bounded queues, so a slow stage applies
+        backpressure instead of stalling the stages around it.
+        """
         logger.info("Entering monitoring loop...")
-        
-        while self.is_running:
+
+        self._transfer_q = asyncio.Queue(maxsize=256)
+        self._enriched_q = asyncio.Queue(maxsize=256)
+        self._persist_q = asyncio.Queue(maxsize=256)
+
+        workers = [
+            *(asyncio.create_task(self._fetch_worker())
+              for _ in range(self.enrich_concurrency)),
+            asyncio.create_task(self._analyze_worker()),
+            asyncio.create_task(self._persist_worker()),
+        ]
+
+        try:
+            async for transfer in self.tracker.subscribe_transfers(
+                addresses=self.monitor_addresses if self.monitor_addresses else None
+            ):
+                if not self.is_running:
+                    break
+                await self._transfer_q.put(transfer)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _fetch_worker(self):
+        """Pipeline stage 1: enrich raw transfers into transaction records"""
+        while True:
+            transfer = await self._transfer_q.get()
             try:
-                # Get latest block
-                current_block = await self.rpc.get_latest_block_number()
-                
-                if current_block > self.last_block:
-                    logger.info(f"Processing blocks {self.last_block + 1} to {current_block}")
-                    
-                    # Process new blocks
-                    await self._process_blocks(self.last_block + 1, current_block)
-                    
-                    self.last_block = current_block
-                
-                # Wait before next poll
-                await asyncio.sleep(self.poll_interval)
-                
+                record = await self._prepare_record(transfer)
+                if record:
+                    await self._enriched_q.put(record)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}", exc_info=True)
-                await asyncio.sleep(self.poll_interval)
-    
-    async def _process_blocks(self, from_block: int, to_block: int):
-        """Process a range of blocks for USDC transfers"""
+                logger.error("Error in fetch worker: %s", e)
+
+    async def _analyze_worker(self):
+        """Pipeline stage 2: score enriched records in batches"""
+        while True:
+            records = [await self._enriched_q.get()]
+            while not self._enriched_q.empty():
+                records.append(self._enriched_q.get_nowait())
+
+            try:
+                # Score the whole batch in one pass — sklearn's per-call
+                # overhead dominates single-row scoring
+                if self.pattern_enabled:
+                    scores = await self.pattern_detector.analyze_batch(records)
+                    for record, score in zip(records, scores):
+                        record['pattern_score'] = float(score)
+                        if score > self.anomaly_threshold:
+                            record['is_flagged'] = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error in analyze worker: %s", e)
+
+            for record in records:
+                await self._persist_q.put(record)
+
+    async def _persist_worker(self):
+        """Pipeline stage 3: flush records every 100 rows or 500 ms"""
+        batch = []
+        while True:
+            try:
+                if batch:
+                    batch.append(await asyncio.wait_for(self._persist_q.get(), timeout=0.5))
+                else:
+                    batch.append(await self._persist_q.get())
+
+                if len(batch) >= 100:
+                    await self._flush_records(batch)
+                    batch = []
+            except asyncio.TimeoutError:
+                await self._flush_records(batch)
+                batch = []
+            except asyncio.CancelledError:
+                # Drain what's already enriched before shutting down
+                await self._flush_records(batch)
+                raise
+
+    async def _flush_records(self, records: List[Dict]):
+        """Bulk-insert a batch of records and dispatch their alerts"""
+        if not records:
+            return
+
         try:
-            # Get USDC transfers in block range
-            transfers = await self.tracker.get_transfers(
-                from_block=from_block,
-                to_block=to_block,
-                addresses=self.monitor_addresses if self.monitor_addresses else None
-            )
-            
-            logger.info(f"Found {len(transfers)} USDC transfers")
-            
-            for transfer in transfers:
-                await self._process_transfer(transfer)
-            
+            logger.info("Persisting %d USDC transfers", len(records))
+            self.last_block = records[-1]['block_number']
+
+            await self.db.insert_transactions(records)
+
+            # Dispatch alerts per record, then persist them in one batch
+            alert_rows = []
+            for record in records:
+                alert_rows.extend(await self._send_alerts(record))
+            await self.db.insert_alerts(alert_rows)
+
         except Exception as e:
-            logger.error(f"Error processing blocks: {e}", exc_info=True)
-    
-    async def _process_transfer(self, transfer: Dict):
-        """Process a single USDC transfer"""
+            logger.error("Error persisting records: %s", e)
+
+    async def _enrich_tx(self, tx_hash: str) -> tuple:
+        """
+        Fetch RPC and Basescan details for a hash, memoized with a TTL
+
+        The same transaction can resurface across overlapping windows or
+        after a reorg; cached hashes skip both network calls. The two
+        lookups are independent, so cache misses run them concurrently —
+        the pair costs one round-trip's latency, bounded across transfers
+        by the enrichment semaphore.
+        """
+        now = time.monotonic()
+        cached = self._enrich_cache.get(tx_hash)
+        if cached is not None:
+            details, expires_at = cached
+            if now < expires_at:
+                self._enrich_cache.move_to_end(tx_hash)
+                return details
+            del self._enrich_cache[tx_hash]
+
+        async with self._enrich_sem:
+            details = await asyncio.gather(
+                self.rpc.get_transaction(tx_hash),
+                self.basescan.get_transaction_details(tx_hash)
+            )
+
+        self._enrich_cache[tx_hash] = (details, now + self.ENRICH_CACHE_TTL)
+        while len(self._enrich_cache) > self.ENRICH_CACHE_MAX:
+            self._enrich_cache.popitem(last=False)
+        return details
+
+    async def _prepare_record(self, transfer: Dict) -> Optional[Dict]:
+        """Enrich a single USDC transfer into a transaction record"""
         try:
             tx_hash = transfer['transactionHash']
-            
-            # Skip if already processed
-            if tx_hash in self.transaction_cache:
-                return
-            
-            self.transaction_cache.add(tx_hash)
-            
+
+            # Duplicate hashes are dropped by the database's UNIQUE(tx_hash)
+            # upsert, so no in-process cache is needed here
+
             # Parse transfer details
             from_address = transfer['from']
             to_address = transfer['to']
             amount = transfer['amount']
             block_number = transfer['blockNumber']
-            
-            logger.info(f"Processing transfer: {amount} USDC from {from_address[:10]}... to {to_address[:10]}...")
-            
+
+            logger.info("Processing transfer: %s USDC from %s... to %s...", amount, from_address[:10], to_address[:10])
+
             # Check for target amount (100 USDC)
-            is_target_amount = abs(amount - self.target_amount) < 0.01
-            
-            # Get additional transaction details
-            tx_details = await self.rpc.get_transaction(tx_hash)
-            
-            # Enrich with Basescan data
-            basescan_data = await self.basescan.get_transaction_details(tx_hash)
-            
+            is_target_amount = self._matches_target(transfer.get('amountRaw'), amount)
+
+            tx_details, basescan_data = await self._enrich_tx(tx_hash)
+
             # Prepare transaction record
             tx_record = {
                 'tx_hash': tx_hash,
@@ -167,33 +310,35 @@ class USDCMonitor:
                 'from_address': from_address,
                 'to_address': to_address,
                 'amount': amount,
+                'amount_raw': transfer.get('amountRaw'),
                 'gas_used': tx_details.get('gas'),
                 'gas_price': tx_details.get('gasPrice'),
                 'status': 'confirmed',
                 'is_flagged': is_target_amount,
                 'pattern_score': 0.0
             }
-            
-            # Detect patterns
-            if os.getenv('PATTERN_DETECTION_ENABLED', 'true').lower() == 'true':
-                pattern_score = await self.pattern_detector.analyze_transaction(tx_record)
-                tx_record['pattern_score'] = pattern_score
-                
-                if pattern_score > float(os.getenv('ANOMALY_THRESHOLD', '0.85')):
-                    tx_record['is_flagged'] = True
-            
-            # Save to database
-            db_record = await self.db.insert_transaction(tx_record)
-            
-            # Send alerts
-            await self._send_alerts(tx_record, is_target_amount)
-            
+
+            # Pattern scoring happens in the analyzer stage via
+            # analyze_batch, not per record here
+
+            return tx_record
+
         except Exception as e:
-            logger.error(f"Error processing transfer: {e}", exc_info=True)
-    
-    async def _send_alerts(self, tx_record: Dict, is_target_amount: bool):
-        """Send appropriate alerts based on transaction"""
+            logger.error("Error processing transfer: %s", e)
+            return None
+
+    def _matches_target(self, amount_raw: Optional[int], amount: float) -> bool:
+        """Exact integer target-amount check, deriving raw units if absent"""
+        if amount_raw is None:
+            amount_raw = round(amount * self._usdc_scale)
+        return abs(amount_raw - self._target_amount_raw) <= self._amount_raw_tolerance
+
+    async def _send_alerts(self, tx_record: Dict) -> List[Dict]:
+        """Send appropriate alerts for a transaction; returns rows for bulk insert"""
         try:
+            is_target_amount = self._matches_target(
+                tx_record.get('amount_raw'), tx_record['amount']
+            )
             alerts = []
             
             # 100 USDC alert
@@ -209,7 +354,7 @@ class USDCMonitor:
                 alerts.append(('target_amount', 'high', alert_msg))
             
             # Pattern anomaly alert
-            if tx_record.get('is_flagged') and tx_record.get('pattern_score', 0) > 0.85:
+            if tx_record.get('is_flagged') and tx_record.get('pattern_score', 0) > self.anomaly_threshold:
                 alert_msg = (
                     f"⚠️ **UNUSUAL PATTERN DETECTED**\n"
                     f"Score: {tx_record['pattern_score']:.2f}\n"
@@ -221,7 +366,7 @@ class USDCMonitor:
                 alerts.append(('pattern_anomaly', 'medium', alert_msg))
             
             # Large transfer alert
-            if tx_record['amount'] > 10000:
+            if tx_record['amount'] > self.LARGE_TRANSFER_USDC:
                 alert_msg = (
                     f"💰 **LARGE TRANSFER DETECTED**\n"
                     f"Amount: {tx_record['amount']:,.2f} USDC\n"
@@ -231,7 +376,8 @@ class USDCMonitor:
                 )
                 alerts.append(('large_transfer', 'high', alert_msg))
             
-            # Send all alerts
+            # Send all alerts; rows go back to the caller for one bulk insert
+            alert_rows = []
             for alert_type, severity, message in alerts:
                 await self.alert_manager.send_alert(
                     alert_type=alert_type,
@@ -239,27 +385,39 @@ class USDCMonitor:
                     message=message,
                     transaction_id=tx_record['tx_hash']
                 )
-                
-                # Save alert to database
-                await self.db.insert_alert({
+
+                alert_rows.append({
                     'transaction_id': tx_record['tx_hash'],
                     'alert_type': alert_type,
                     'severity': severity,
                     'message': message
                 })
-            
+
+            return alert_rows
+
         except Exception as e:
-            logger.error(f"Error sending alerts: {e}", exc_info=True)
+            logger.error("Error sending alerts: %s", e)
+            return []
     
     async def stop(self):
         """Stop the monitor gracefully"""
         logger.info("Stopping USDC Monitor...")
         self.is_running = False
-        
-        # Cleanup
+
+        # Cancelling unblocks the subscription iterator immediately —
+        # the loop may otherwise sit waiting for a watched transfer that
+        # never arrives. Client cleanup runs in start() afterwards.
+        if self._monitor_task is not None and not self._monitor_task.done():
+            self._monitor_task.cancel()
+
+    async def _close_clients(self):
+        """Close every component client once the loop has exited"""
+        await self.alert_manager.close()
+        await self.basescan.close()
+        await self.bitquery.close()
         await self.db.close()
         await self.rpc.close()
-        
+
         logger.info("Monitor stopped")
     
     def _signal_handler(self, signum, frame):
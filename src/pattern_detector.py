@@ -8,7 +8,7 @@ import logging
 import numpy as np
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict, deque
 import os
 
 try:
@@ -21,33 +21,76 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Suspiciously round amounts, hoisted so the membership test is one
+# hash lookup instead of rebuilding a list per transaction
+_ROUND_AMOUNTS = frozenset({100, 500, 1000, 5000, 10000, 50000, 100000})
+
+# Capacity of the per-address stats table and its per-address ring width
+_MAX_ADDRS = 10_000
+_ADDR_RING = 10
+
 
 class PatternDetector:
     """
     Detects anomalous patterns in USDC transactions
     """
-    
+
+    # Below this much history every sub-analysis returns a cold-start
+    # placeholder, so scoring is skipped entirely
+    MIN_HISTORY = 10
+
     def __init__(self):
         self.anomaly_threshold = float(os.getenv('ANOMALY_THRESHOLD', '0.85'))
         self.pattern_window = int(os.getenv('PATTERN_WINDOW', '100'))
         self.frequency_threshold = int(os.getenv('FREQUENCY_SPIKE_THRESHOLD', '5'))
         self.amount_deviation_threshold = float(os.getenv('AMOUNT_DEVIATION_THRESHOLD', '3'))
         
-        # Transaction history for pattern analysis
-        self.transaction_history = []
-        self.address_stats = defaultdict(lambda: {'count': 0, 'amounts': [], 'timestamps': []})
+        # Transaction history for pattern analysis — deque evicts the
+        # oldest entry in O(1) instead of periodic O(window) list slices
+        self.transaction_history = deque(maxlen=self.pattern_window)
+
+        # Per-address stats laid out as shared NumPy columns indexed by a
+        # bounded address -> row map (LRU-evicted), instead of a Python
+        # dict-of-lists per address that grows without limit. Each row
+        # holds the address's last _ADDR_RING amounts/timestamps.
+        self._addr_to_id = OrderedDict()
+        self._addr_counts = np.zeros(_MAX_ADDRS, dtype=np.int32)
+        self._addr_amt_ring = np.zeros((_MAX_ADDRS, _ADDR_RING), dtype=np.float64)
+        self._addr_ts_ring = np.full((_MAX_ADDRS, _ADDR_RING), np.nan)
+        self._addr_writes = np.zeros(_MAX_ADDRS, dtype=np.int64)
+
+        # Preallocated ring buffer of recent amounts with running sums, so
+        # per-transaction mean/std is O(1) instead of rebuilding a Python
+        # list over the whole window every call
+        self._amounts = np.zeros(self.pattern_window, dtype=np.float64)
+        # Parallel ring of POSIX timestamps (NaN where unparseable), so
+        # timing checks subtract floats instead of re-parsing ISO strings
+        self._ts_epochs = np.full(self.pattern_window, np.nan)
+        self._amounts_idx = 0
+        self._amounts_n = 0
+        self._amounts_sum = 0.0
+        self._amounts_sum_sq = 0.0
         
         # Initialize ML model if available
         if SKLEARN_AVAILABLE:
             self.isolation_forest = IsolationForest(
-                contamination=0.1,
-                random_state=42
+                contamination='auto',
+                random_state=42,
+                n_jobs=1
             )
             self.scaler = StandardScaler()
             self.model_trained = False
         else:
             self.isolation_forest = None
             self.model_trained = False
+
+        # Scratch row reused for single-sample scoring, so the fallback
+        # path doesn't allocate a fresh array per transaction
+        self._ml_scratch = np.empty((1, 4))
+
+        # Scratch vector for the per-transaction sub-scores (up to five),
+        # reused instead of growing a Python list every call
+        self._score_scratch = np.empty(5)
         
         logger.info("Pattern Detector initialized")
     
@@ -57,74 +100,197 @@ class PatternDetector:
         Higher score = more anomalous
         """
         try:
-            scores = []
-            
+            # Pull fields out once; the sub-analyses take scalars instead
+            # of re-doing the same dict lookups
+            amount = transaction.get('amount', 0)
+            from_addr = transaction.get('from_address')
+            to_addr = transaction.get('to_address')
+            timestamp = transaction.get('timestamp')
+
             # Update history
             self._update_history(transaction)
-            
-            # Statistical analysis
-            stat_score = self._statistical_analysis(transaction)
-            scores.append(stat_score)
-            
-            # Frequency analysis
-            freq_score = self._frequency_analysis(transaction)
-            scores.append(freq_score)
-            
-            # Amount clustering analysis
-            amount_score = self._amount_analysis(transaction)
-            scores.append(amount_score)
-            
-            # Timing analysis
-            timing_score = self._timing_analysis(transaction)
-            scores.append(timing_score)
-            
+
+            # Too little history for any sub-analysis to say something
+            # meaningful — skip the whole scoring pass
+            if self._amounts_n < self.MIN_HISTORY:
+                return 0.0
+
+            scores = self._score_scratch
+            scores[0] = self._statistical_analysis(amount)
+            scores[1] = self._frequency_analysis(from_addr, to_addr)
+            scores[2] = self._amount_analysis(amount)
+            scores[3] = self._timing_analysis(timestamp)
+            n_scores = 4
+
             # ML-based analysis (if available and trained)
             if self.model_trained and len(self.transaction_history) >= self.pattern_window:
-                ml_score = self._ml_analysis(transaction)
-                scores.append(ml_score)
-            
+                scores[4] = self._ml_analysis(transaction)
+                n_scores = 5
+
             # Combine scores (weighted average)
-            final_score = np.mean(scores)
-            
-            logger.debug(f"Transaction anomaly score: {final_score:.4f}")
-            return float(final_score)
+            final_score = float(scores[:n_scores].mean())
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Transaction anomaly score: %.4f", final_score)
+            return final_score
             
         except Exception as e:
-            logger.error(f"Error analyzing transaction: {e}", exc_info=True)
+            logger.error("Error analyzing transaction: %s", e)
             return 0.0
     
+    async def analyze_batch(self, transactions: List[Dict]) -> np.ndarray:
+        """
+        Analyze many transactions at once, returning an array of scores
+
+        The ML model scores the whole (N, F) feature matrix in a single
+        score_samples call instead of once per row, which is where nearly
+        all of sklearn's per-call overhead goes.
+        """
+        if not transactions:
+            return np.empty(0)
+
+        try:
+            # Batch the ML pass up front
+            ml_scores = None
+            if SKLEARN_AVAILABLE and self.model_trained:
+                features = np.array(
+                    [self._extract_features(tx) for tx in transactions],
+                    dtype=np.float64
+                )
+                raw = self.isolation_forest.score_samples(features)
+                # Normalize from [-1, 1] to [0, 1] (lower raw = more anomalous)
+                ml_scores = 1 - (raw + 1) / 2
+
+            final_scores = np.empty(len(transactions))
+            scores = self._score_scratch
+            for i, transaction in enumerate(transactions):
+                amount = transaction.get('amount', 0)
+                self._update_history(transaction)
+
+                if self._amounts_n < self.MIN_HISTORY:
+                    final_scores[i] = 0.0
+                    continue
+
+                scores[0] = self._statistical_analysis(amount)
+                scores[1] = self._frequency_analysis(
+                    transaction.get('from_address'),
+                    transaction.get('to_address')
+                )
+                scores[2] = self._amount_analysis(amount)
+                scores[3] = self._timing_analysis(transaction.get('timestamp'))
+                n_scores = 4
+
+                if ml_scores is not None and len(self.transaction_history) >= self.pattern_window:
+                    scores[4] = ml_scores[i]
+                    n_scores = 5
+
+                final_scores[i] = scores[:n_scores].mean()
+
+            return final_scores
+
+        except Exception as e:
+            logger.error("Error analyzing transaction batch: %s", e)
+            return np.zeros(len(transactions))
+
     def _update_history(self, transaction: Dict):
         """Update transaction history"""
         self.transaction_history.append(transaction)
-        
-        # Keep only recent transactions
-        if len(self.transaction_history) > self.pattern_window * 2:
-            self.transaction_history = self.transaction_history[-self.pattern_window:]
-        
+
         # Update address statistics
         from_addr = transaction.get('from_address')
         to_addr = transaction.get('to_address')
         amount = transaction.get('amount', 0)
         timestamp = transaction.get('timestamp')
-        
+
+        # Parse the ISO timestamp exactly once per transaction; everything
+        # downstream works on the epoch float
+        try:
+            ts_epoch = datetime.fromisoformat(timestamp).timestamp() if timestamp else None
+        except (TypeError, ValueError):
+            ts_epoch = None
+
+        # Roll the amount into the ring buffer, retiring the value it
+        # overwrites from the running sums
+        value = float(amount)
+        pos = self._amounts_idx
+        if self._amounts_n == self.pattern_window:
+            old = self._amounts[pos]
+            self._amounts_sum -= old
+            self._amounts_sum_sq -= old * old
+        else:
+            self._amounts_n += 1
+        self._amounts[pos] = value
+        self._amounts_sum += value
+        self._amounts_sum_sq += value * value
+        self._ts_epochs[pos] = ts_epoch if ts_epoch is not None else np.nan
+        self._amounts_idx = (pos + 1) % self.pattern_window
+
         for addr in [from_addr, to_addr]:
             if addr:
-                self.address_stats[addr]['count'] += 1
-                self.address_stats[addr]['amounts'].append(amount)
-                self.address_stats[addr]['timestamps'].append(timestamp)
+                aid = self._get_or_alloc_addr(addr)
+                self._addr_counts[aid] += 1
+                slot = self._addr_writes[aid] % _ADDR_RING
+                self._addr_amt_ring[aid, slot] = value
+                self._addr_ts_ring[aid, slot] = ts_epoch if ts_epoch is not None else np.nan
+                self._addr_writes[aid] += 1
+
+    def _get_or_alloc_addr(self, addr: str) -> int:
+        """Return the stats row for an address, evicting the coldest if full"""
+        aid = self._addr_to_id.get(addr)
+        if aid is not None:
+            self._addr_to_id.move_to_end(addr)
+            return aid
+
+        if len(self._addr_to_id) >= _MAX_ADDRS:
+            # Reuse the least-recently-seen address's row
+            _, aid = self._addr_to_id.popitem(last=False)
+            self._addr_counts[aid] = 0
+            self._addr_writes[aid] = 0
+            self._addr_amt_ring[aid].fill(0.0)
+            self._addr_ts_ring[aid].fill(np.nan)
+        else:
+            aid = len(self._addr_to_id)
+
+        self._addr_to_id[addr] = aid
+        return aid
+
+    def _addr_recent_timestamps(self, aid: int) -> np.ndarray:
+        """Return an address's ring timestamps in order, NaNs dropped"""
+        total = int(self._addr_writes[aid])
+        row = self._addr_ts_ring[aid]
+
+        if total >= _ADDR_RING:
+            idx = total % _ADDR_RING
+            ordered = np.concatenate((row[idx:], row[:idx]))
+        else:
+            ordered = row[:total]
+
+        return ordered[~np.isnan(ordered)]
     
-    def _statistical_analysis(self, transaction: Dict) -> float:
+    def _recent_amounts(self, count: int) -> np.ndarray:
+        """Return the last count amounts from the ring buffer, oldest first"""
+        take = min(count, self._amounts_n)
+        if take == 0:
+            return self._amounts[:0]
+
+        idx = self._amounts_idx
+        start = (idx - take) % self.pattern_window
+        if start < idx:
+            return self._amounts[start:idx]
+        return np.concatenate((self._amounts[start:], self._amounts[:idx]))
+
+    def _statistical_analysis(self, current_amount: float) -> float:
         """Statistical analysis based on amount deviations"""
         try:
-            if len(self.transaction_history) < 10:
+            n = self._amounts_n
+            if n < self.MIN_HISTORY:
                 return 0.0
-            
-            amounts = [t.get('amount', 0) for t in self.transaction_history]
-            current_amount = transaction.get('amount', 0)
-            
-            mean_amount = np.mean(amounts)
-            std_amount = np.std(amounts)
-            
+
+            # O(1) mean/std from the running sums
+            mean_amount = self._amounts_sum / n
+            variance = max(self._amounts_sum_sq / n - mean_amount * mean_amount, 0.0)
+            std_amount = variance ** 0.5
+
             if std_amount == 0:
                 return 0.0
             
@@ -137,62 +303,46 @@ class PatternDetector:
             return score
             
         except Exception as e:
-            logger.error(f"Error in statistical analysis: {e}")
+            logger.error("Error in statistical analysis: %s", e)
             return 0.0
     
-    def _frequency_analysis(self, transaction: Dict) -> float:
+    def _frequency_analysis(self, from_addr: Optional[str], to_addr: Optional[str]) -> float:
         """Analyze transaction frequency for addresses"""
         try:
-            from_addr = transaction.get('from_address')
-            to_addr = transaction.get('to_address')
-            
             scores = []
             
             for addr in [from_addr, to_addr]:
-                if addr and addr in self.address_stats:
-                    stats = self.address_stats[addr]
-                    
-                    # Check recent transaction frequency
-                    recent_timestamps = stats['timestamps'][-10:]
+                aid = self._addr_to_id.get(addr) if addr else None
+                if aid is not None:
+                    # Check recent transaction frequency — timestamps are
+                    # stored pre-parsed as epoch floats, so the average gap
+                    # is one vectorized diff over the address's ring
+                    recent_timestamps = self._addr_recent_timestamps(aid)
                     if len(recent_timestamps) >= 2:
-                        # Calculate average time between transactions
-                        time_diffs = []
-                        for i in range(1, len(recent_timestamps)):
-                            try:
-                                t1 = datetime.fromisoformat(recent_timestamps[i-1])
-                                t2 = datetime.fromisoformat(recent_timestamps[i])
-                                diff = (t2 - t1).total_seconds() / 3600  # hours
-                                time_diffs.append(diff)
-                            except:
-                                continue
-                        
-                        if time_diffs:
-                            avg_hours = np.mean(time_diffs)
-                            
-                            # High frequency = low hours between transactions
-                            if avg_hours < 1:  # Less than 1 hour average
-                                frequency_score = 0.8
-                            elif avg_hours < 6:  # Less than 6 hours
-                                frequency_score = 0.5
-                            else:
-                                frequency_score = 0.1
-                            
-                            scores.append(frequency_score)
+                        avg_hours = float(np.mean(np.diff(recent_timestamps))) / 3600
+
+                        # High frequency = low hours between transactions
+                        if avg_hours < 1:  # Less than 1 hour average
+                            frequency_score = 0.8
+                        elif avg_hours < 6:  # Less than 6 hours
+                            frequency_score = 0.5
+                        else:
+                            frequency_score = 0.1
+
+                        scores.append(frequency_score)
             
             return np.mean(scores) if scores else 0.0
             
         except Exception as e:
-            logger.error(f"Error in frequency analysis: {e}")
+            logger.error("Error in frequency analysis: %s", e)
             return 0.0
     
-    def _amount_analysis(self, transaction: Dict) -> float:
+    def _amount_analysis(self, current_amount: float) -> float:
         """Analyze if amount is part of unusual clustering"""
         try:
-            current_amount = transaction.get('amount', 0)
-            
-            # Check for exact amount repetition
-            recent_amounts = [t.get('amount', 0) for t in self.transaction_history[-20:]]
-            exact_matches = sum(1 for amt in recent_amounts if abs(amt - current_amount) < 0.01)
+            # Check for exact amount repetition (vectorized over the ring)
+            recent_amounts = self._recent_amounts(20)
+            exact_matches = int(np.count_nonzero(np.abs(recent_amounts - current_amount) < 0.01))
             
             # High repetition of exact amounts is suspicious
             if exact_matches >= 5:
@@ -201,46 +351,47 @@ class PatternDetector:
                 return 0.6
             
             # Check for round numbers (100, 1000, 10000, etc.)
-            if current_amount in [100, 500, 1000, 5000, 10000, 50000, 100000]:
+            if current_amount in _ROUND_AMOUNTS:
                 return 0.7
             
             return 0.2
             
         except Exception as e:
-            logger.error(f"Error in amount analysis: {e}")
+            logger.error("Error in amount analysis: %s", e)
             return 0.0
     
-    def _timing_analysis(self, transaction: Dict) -> float:
+    def _timing_analysis(self, timestamp_str: Optional[str]) -> float:
         """Analyze transaction timing patterns"""
         try:
-            timestamp_str = transaction.get('timestamp')
             if not timestamp_str:
                 return 0.0
             
             timestamp = datetime.fromisoformat(timestamp_str)
             hour = timestamp.hour
-            
+
             # Unusual hours (2 AM - 5 AM) get higher score
             if 2 <= hour <= 5:
                 return 0.6
-            
-            # Check if part of rapid succession
-            if len(self.transaction_history) >= 2:
-                last_tx = self.transaction_history[-2]
-                last_timestamp = datetime.fromisoformat(last_tx.get('timestamp'))
-                
-                time_diff = (timestamp - last_timestamp).total_seconds()
-                
-                # Transactions within 30 seconds
-                if time_diff < 30:
-                    return 0.8
-                elif time_diff < 300:  # 5 minutes
-                    return 0.5
+
+            # Check if part of rapid succession — the previous transaction's
+            # epoch sits in the ring, no re-parse needed
+            if self._amounts_n >= 2:
+                prev_pos = (self._amounts_idx - 2) % self.pattern_window
+                last_epoch = self._ts_epochs[prev_pos]
+
+                if not np.isnan(last_epoch):
+                    time_diff = timestamp.timestamp() - last_epoch
+
+                    # Transactions within 30 seconds
+                    if time_diff < 30:
+                        return 0.8
+                    elif time_diff < 300:  # 5 minutes
+                        return 0.5
             
             return 0.1
             
         except Exception as e:
-            logger.error(f"Error in timing analysis: {e}")
+            logger.error("Error in timing analysis: %s", e)
             return 0.0
     
     def _ml_analysis(self, transaction: Dict) -> float:
@@ -249,11 +400,13 @@ class PatternDetector:
             if not SKLEARN_AVAILABLE or not self.model_trained:
                 return 0.0
             
-            # Extract features
-            features = self._extract_features(transaction)
-            
+            # Extract features into the reusable scratch row — batch
+            # callers should prefer analyze_batch, which amortizes
+            # sklearn's per-call overhead over the whole matrix
+            self._ml_scratch[0] = self._extract_features(transaction)
+
             # Predict anomaly score
-            score = self.isolation_forest.score_samples([features])[0]
+            score = self.isolation_forest.score_samples(self._ml_scratch)[0]
             
             # Convert to 0-1 range (lower score = more anomalous)
             normalized_score = (1 - (score + 1) / 2)  # Normalize from [-1, 1] to [0, 1]
@@ -261,7 +414,7 @@ class PatternDetector:
             return float(normalized_score)
             
         except Exception as e:
-            logger.error(f"Error in ML analysis: {e}")
+            logger.error("Error in ML analysis: %s", e)
             return 0.0
     
     def _extract_features(self, transaction: Dict) -> List[float]:
@@ -300,7 +453,7 @@ class PatternDetector:
         """Get current pattern detection statistics"""
         return {
             'total_transactions_analyzed': len(self.transaction_history),
-            'unique_addresses': len(self.address_stats),
+            'unique_addresses': len(self._addr_to_id),
             'model_trained': self.model_trained,
             'anomaly_threshold': self.anomaly_threshold
         }
\ No newline at end of file
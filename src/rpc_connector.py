@@ -6,24 +6,69 @@ Handles all Web3 RPC interactions with Base network
 
 import asyncio
 import logging
-from typing import Dict, List, Optional
+import random
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+import orjson
 from web3 import Web3, AsyncWeb3
 from web3.middleware import geth_poa_middleware
 import os
-from dotenv import load_dotenv
+try:
+    from . import config
+except ImportError:
+    import config
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Minimal ERC-20 balanceOf ABI, shared by every cached token contract
+_BALANCE_OF_ABI = [
+    {
+        'constant': True,
+        'inputs': [{'name': '_owner', 'type': 'address'}],
+        'name': 'balanceOf',
+        'outputs': [{'name': 'balance', 'type': 'uint256'}],
+        'type': 'function'
+    }
+]
+
+
+@lru_cache(maxsize=65536)
+def checksum_address(address: str) -> str:
+    """
+    Memoized EIP-55 checksum encoding
+
+    to_checksum_address runs a keccak per call; transfer streams repeat
+    the same addresses (exchanges, bridges) heavily, so cached hits cost
+    one dict lookup instead. Pass lowercase hex so keys normalize.
+    """
+    return Web3.to_checksum_address(address)
+
+
+class RPCError(Exception):
+    """JSON-RPC error response returned by the node"""
+
+    def __init__(self, method: str, code: Optional[int], message: str):
+        super().__init__(f"{method}: {message} (code {code})")
+        self.method = method
+        self.code = code
+        self.message = message
+
 
 class BaseRPCConnector:
     """
     Manages connection to Base network RPC endpoints
     """
-    
+
+    # orjson handles request/response bodies (C implementation, much
+    # faster than stdlib json on MB-scale eth_getLogs responses)
+    _JSON_HEADERS = {'Content-Type': 'application/json'}
+
     def __init__(self):
         self.rpc_url = os.getenv('BASE_RPC_URL', 'https://mainnet.base.org')
         self.rpc_url_backup = os.getenv('BASE_RPC_URL_BACKUP', 'https://base.llamarpc.com')
+        self.wss_url = os.getenv('BASE_WSS_URL', 'wss://mainnet.base.org')
         self.chain_id = int(os.getenv('BASE_CHAIN_ID', '8453'))
         
         logger.info(f"Initializing Base RPC connection to {self.rpc_url}")
@@ -44,51 +89,362 @@ class BaseRPCConnector:
         else:
             logger.error("Failed to connect to Base network")
             raise ConnectionError("Cannot connect to Base RPC")
-    
+
+        # Shared aiohttp session for raw JSON-RPC calls (created lazily).
+        # The timeout is applied per-POST rather than on the session so it
+        # never touches the long-lived ws_connect subscription; without it
+        # aiohttp's 300s default would starve the adaptive getLogs
+        # windowing, which treats asyncio.TimeoutError as "range too big".
+        self._session = None
+        self._rpc_timeout = aiohttp.ClientTimeout(total=30, connect=3)
+
+        # Bulkhead for getLogs fan-out: chunked ranges can spawn hundreds
+        # of concurrent windows, and public endpoints rate-limit well
+        # before the TCP pool would (raise for paid endpoints)
+        self._log_sem = asyncio.Semaphore(int(os.getenv('RPC_MAX_CONCURRENCY', '8')))
+
+        # Short-lived latest-block cache (Base block time is ~2s, so a
+        # sub-second TTL coalesces concurrent pollers onto a single RPC
+        # call with no correctness penalty)
+        self._latest_block_cache = None
+        self._latest_block_ttl = float(os.getenv('LATEST_BLOCK_TTL_SEC', '1.0'))
+        self._latest_block_lock = asyncio.Lock()
+
+        # Per-ABI event topic maps for decode_log, so the keccak of every
+        # event signature runs once per ABI instead of once per log. The
+        # ABI reference is kept alongside the map so its id() stays valid.
+        self._abi_topic_maps = {}
+
+        # Contract objects cached per token address — web3's .contract()
+        # constructor is expensive, and balance polling hits the same
+        # token every time
+        self._token_contracts = {}
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Create the shared aiohttp session on first use"""
+        if self._session is None or self._session.closed:
+            # Keep-alive pool: reusing connections avoids paying the
+            # TCP/TLS handshake on every poll
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=64,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=75
+                )
+            )
+        return self._session
+
+    async def call(self, method: str, params: List,
+                   raise_on_error: bool = False) -> Optional[Dict]:
+        """
+        Send a single JSON-RPC call over the shared session
+
+        Args:
+            method: JSON-RPC method name (e.g. 'eth_blockNumber')
+            params: Method parameters
+            raise_on_error: Raise RPCError / transport errors instead of
+                returning None, for callers that react to specific
+                failures (e.g. shrinking an oversized getLogs window)
+
+        Returns:
+            The JSON-RPC result, or None on error
+        """
+        try:
+            payload = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}
+
+            session = await self._ensure_session()
+            async with session.post(
+                self.rpc_url, data=orjson.dumps(payload),
+                headers=self._JSON_HEADERS, timeout=self._rpc_timeout
+            ) as response:
+                data = orjson.loads(await response.read())
+
+            if 'error' in data:
+                if raise_on_error:
+                    error = data['error']
+                    raise RPCError(method, error.get('code'), error.get('message', str(error)))
+                logger.error(f"RPC error for {method}: {data['error']}")
+                return None
+
+            return data.get('result')
+
+        except Exception as e:
+            if raise_on_error:
+                raise
+            logger.error(f"Error in JSON-RPC call {method}: {e}")
+            return None
+
+    async def batch_call(self, requests: List[Tuple[str, List]]) -> List:
+        """
+        Send multiple JSON-RPC calls in a single HTTP POST
+
+        Batching collapses N round-trips into one request, which matters
+        when firing many eth_getLogs windows in parallel.
+
+        Args:
+            requests: List of (method, params) tuples
+
+        Returns:
+            List of results in the same order as the requests
+        """
+        if not requests:
+            return []
+
+        try:
+            payload = [
+                {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                for i, (method, params) in enumerate(requests)
+            ]
+
+            session = await self._ensure_session()
+            async with session.post(
+                self.rpc_url, data=orjson.dumps(payload),
+                headers=self._JSON_HEADERS, timeout=self._rpc_timeout
+            ) as response:
+                responses = orjson.loads(await response.read())
+
+            # Responses may arrive out of order; re-sort by request id
+            results = [None] * len(requests)
+            for item in responses:
+                if 'error' in item:
+                    logger.error(f"RPC batch error for id {item.get('id')}: {item['error']}")
+                    continue
+                results[item['id']] = item.get('result')
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Error in JSON-RPC batch call: {e}")
+            return [None] * len(requests)
+
+    async def get_transactions(self, tx_hashes: List[str],
+                               chunk_size: int = 100) -> List[Dict]:
+        """
+        Get details for many transactions via batched JSON-RPC
+
+        N hashes cost ceil(N / chunk_size) HTTP round-trips instead of N.
+        Results keep the input order; failed lookups come back as {}.
+
+        Args:
+            tx_hashes: Transaction hashes to fetch
+            chunk_size: Maximum calls per HTTP request
+
+        Returns:
+            List of transaction dicts, quantity fields decoded to ints
+        """
+        return await self._batch_fetch(
+            'eth_getTransactionByHash', tx_hashes, self._TX_INT_FIELDS, chunk_size
+        )
+
+    async def get_receipts(self, tx_hashes: List[str],
+                           chunk_size: int = 100) -> List[Dict]:
+        """
+        Get receipts for many transactions via batched JSON-RPC
+
+        Same shape as get_transactions: one HTTP round-trip per chunk,
+        input order preserved, {} for failed lookups.
+        """
+        return await self._batch_fetch(
+            'eth_getTransactionReceipt', tx_hashes, self._RECEIPT_INT_FIELDS, chunk_size
+        )
+
+    async def _batch_fetch(self, method: str, tx_hashes: List[str],
+                           int_fields: Tuple[str, ...], chunk_size: int) -> List[Dict]:
+        """Fan a single-hash method over many hashes in sub-batches"""
+        if not tx_hashes:
+            return []
+
+        results = []
+        for i in range(0, len(tx_hashes), chunk_size):
+            chunk = tx_hashes[i:i + chunk_size]
+            responses = await self.batch_call([(method, [h]) for h in chunk])
+            results.extend(self._decode_ints(obj, int_fields) for obj in responses)
+        return results
+
     async def get_latest_block_number(self) -> int:
-        """Get the latest block number"""
+        """Get the latest block number (cached for ~1s)"""
         try:
-            return self.w3.eth.block_number
+            # The lock ensures concurrent callers wait on one in-flight
+            # fetch instead of each hitting the RPC
+            async with self._latest_block_lock:
+                now = time.monotonic()
+                if self._latest_block_cache is not None:
+                    ts, value = self._latest_block_cache
+                    if now - ts < self._latest_block_ttl:
+                        return value
+
+                result = await self.call('eth_blockNumber', [])
+                if result is None:
+                    raise ConnectionError("eth_blockNumber returned no result")
+
+                block_number = int(result, 16)
+                self._latest_block_cache = (time.monotonic(), block_number)
+                return block_number
         except Exception as e:
             logger.error(f"Error getting latest block: {e}")
             raise
-    
+
     async def get_block(self, block_number: int, full_transactions: bool = False) -> Dict:
         """Get block data"""
         try:
-            return dict(self.w3.eth.get_block(block_number, full_transactions=full_transactions))
+            result = await self.call(
+                'eth_getBlockByNumber', [hex(block_number), full_transactions]
+            )
+            if result is None:
+                raise ConnectionError(f"eth_getBlockByNumber returned no result for {block_number}")
+            return result
         except Exception as e:
             logger.error(f"Error getting block {block_number}: {e}")
             raise
     
+    # Quantity fields decoded from hex to int on transaction/receipt
+    # responses, matching what the old web3 accessors returned
+    _TX_INT_FIELDS = ('blockNumber', 'gas', 'gasPrice', 'maxFeePerGas',
+                      'maxPriorityFeePerGas', 'nonce', 'transactionIndex', 'value')
+    _RECEIPT_INT_FIELDS = ('blockNumber', 'cumulativeGasUsed', 'effectiveGasPrice',
+                           'gasUsed', 'status', 'transactionIndex')
+
+    @staticmethod
+    def _decode_ints(obj: Optional[Dict], fields: Tuple[str, ...]) -> Dict:
+        """Convert hex quantity fields of a JSON-RPC object to ints"""
+        if not obj:
+            return {}
+        for field in fields:
+            value = obj.get(field)
+            if isinstance(value, str):
+                obj[field] = int(value, 16)
+        return obj
+
     async def get_transaction(self, tx_hash: str) -> Dict:
         """Get transaction details"""
         try:
-            tx = self.w3.eth.get_transaction(tx_hash)
-            return dict(tx)
+            tx = await self.call('eth_getTransactionByHash', [tx_hash])
+            return self._decode_ints(tx, self._TX_INT_FIELDS)
         except Exception as e:
             logger.error(f"Error getting transaction {tx_hash}: {e}")
             return {}
-    
+
     async def get_transaction_receipt(self, tx_hash: str) -> Dict:
         """Get transaction receipt"""
         try:
-            receipt = self.w3.eth.get_transaction_receipt(tx_hash)
-            return dict(receipt)
+            receipt = await self.call('eth_getTransactionReceipt', [tx_hash])
+            return self._decode_ints(receipt, self._RECEIPT_INT_FIELDS)
         except Exception as e:
             logger.error(f"Error getting receipt for {tx_hash}: {e}")
             return {}
     
-    async def get_logs(self, filter_params: Dict) -> List[Dict]:
-        """Get event logs based on filter parameters"""
-        try:
-            logs = self.w3.eth.get_logs(filter_params)
-            return [dict(log) for log in logs]
-        except Exception as e:
-            logger.error(f"Error getting logs: {e}")
-            return []
+    async def get_logs(self, filter_params: Dict,
+                       raise_on_error: bool = False) -> List[Dict]:
+        """
+        Get event logs based on filter parameters
+
+        Goes over the shared session, so block numbers must be hex strings
+        ('fromBlock'/'toBlock' ints are converted automatically). Returns
+        raw JSON-RPC logs (topics/data as hex strings). With
+        raise_on_error, provider failures (RPCError, timeouts) propagate
+        so callers can adapt their window size.
+
+        Concurrency across callers is capped by RPC_MAX_CONCURRENCY, and
+        rate-limit rejections retry with jittered exponential backoff
+        before any error reaches the caller.
+        """
+        params = dict(filter_params)
+        for key in ('fromBlock', 'toBlock'):
+            if isinstance(params.get(key), int):
+                params[key] = hex(params[key])
+
+        delay = 0.5
+        for attempt in range(4):
+            try:
+                async with self._log_sem:
+                    logs = await self.call('eth_getLogs', [params], raise_on_error=True)
+                return logs or []
+            except Exception as e:
+                if self._is_rate_limited(e) and attempt < 3:
+                    logger.warning("getLogs rate-limited, retrying in up to %.1fs", delay)
+                    await asyncio.sleep(random.uniform(0, delay))
+                    delay *= 2
+                    continue
+                if raise_on_error:
+                    raise
+                logger.error(f"Error getting logs: {e}")
+                return []
+
+    @staticmethod
+    def _is_rate_limited(exc: BaseException) -> bool:
+        """True for provider rate-limit rejections worth backing off on"""
+        if isinstance(exc, RPCError):
+            message = exc.message.lower() if exc.message else ''
+            return exc.code in (-32016, 429) or 'rate limit' in message
+        return isinstance(exc, aiohttp.ClientResponseError) and exc.status == 429
     
-    def create_filter(self, contract_address: str, event_signature: str, 
+    async def subscribe_logs(self, address: str = None, topics: List = None):
+        """
+        Subscribe to event logs over WebSocket (eth_subscribe)
+
+        Async generator yielding raw logs as the node pushes them —
+        no polling round-trips and sub-second detection latency.
+        Reconnects with exponential backoff on disconnect.
+
+        Args:
+            address: Optional contract address to filter
+            topics: Optional topic filter list
+
+        Yields:
+            Raw log dicts as pushed by the node
+        """
+        params = {}
+        if address:
+            params['address'] = Web3.to_checksum_address(address)
+        if topics:
+            params['topics'] = topics
+
+        backoff = 1.0
+        while True:
+            try:
+                session = await self._ensure_session()
+                async with session.ws_connect(self.wss_url) as ws:
+                    await ws.send_json({
+                        'jsonrpc': '2.0',
+                        'id': 1,
+                        'method': 'eth_subscribe',
+                        'params': ['logs', params]
+                    })
+
+                    logger.info(f"✓ Subscribed to logs via {self.wss_url}")
+                    backoff = 1.0
+
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+
+                        data = msg.json()
+                        result = data.get('params', {}).get('result')
+                        if not result:
+                            continue
+
+                        # Reorged logs are re-emitted with removed=true;
+                        # passing them through would replay alerts for
+                        # transfers that were just unwound
+                        if result.get('removed'):
+                            logger.info(
+                                "Skipping reorged log %s",
+                                result.get('transactionHash')
+                            )
+                            continue
+
+                        yield result
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket subscription error: {e}")
+
+            logger.warning(f"WebSocket disconnected, reconnecting in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def create_filter(self, contract_address: str, event_signature: str,
                      from_block: int, to_block: int = 'latest') -> Dict:
         """Create a log filter for events"""
         return {
@@ -98,19 +454,34 @@ class BaseRPCConnector:
             'topics': [event_signature]
         }
     
+    def _event_topic_map(self, abi: List[Dict]) -> Dict[str, Dict]:
+        """Map topic0 hex -> event ABI entry, hashed once per ABI"""
+        entry = self._abi_topic_maps.get(id(abi))
+        if entry is not None:
+            return entry[1]
+
+        topic_map = {}
+        for item in abi:
+            if item['type'] == 'event':
+                signature = f"{item['name']}({','.join(inp['type'] for inp in item['inputs'])})"
+                topic_map[Web3.keccak(text=signature).hex().lower()] = item
+
+        self._abi_topic_maps[id(abi)] = (abi, topic_map)
+        return topic_map
+
     def decode_log(self, log: Dict, abi: List[Dict]) -> Dict:
         """Decode an event log"""
         try:
-            # Find event in ABI
-            event_abi = None
-            for item in abi:
-                if item['type'] == 'event' and log['topics'][0].hex() == self.w3.keccak(text=f"{item['name']}({','.join([inp['type'] for inp in item['inputs']])})").hex():
-                    event_abi = item
-                    break
-            
+            # Topics arrive as hex strings over the raw JSON-RPC path and
+            # as HexBytes from web3 helpers; normalize to lowercase hex
+            topic0 = log['topics'][0]
+            if not isinstance(topic0, str):
+                topic0 = topic0.hex()
+
+            event_abi = self._event_topic_map(abi).get(topic0.lower())
             if not event_abi:
                 return {}
-            
+
             # Decode log
             decoded = self.w3.eth.contract(abi=[event_abi]).events[event_abi['name']]().process_log(log)
             return dict(decoded['args'])
@@ -121,32 +492,31 @@ class BaseRPCConnector:
     def get_balance(self, address: str) -> float:
         """Get ETH balance of address"""
         try:
-            balance_wei = self.w3.eth.get_balance(Web3.to_checksum_address(address))
+            balance_wei = self.w3.eth.get_balance(checksum_address(address.lower()))
             return self.w3.from_wei(balance_wei, 'ether')
         except Exception as e:
             logger.error(f"Error getting balance for {address}: {e}")
             return 0.0
     
+    def _get_token_contract(self, token_address: str):
+        """Return the cached balanceOf contract for a token, building on miss"""
+        key = token_address.lower()
+        contract = self._token_contracts.get(key)
+        if contract is None:
+            # Constructing with an already-checksummed address also skips
+            # web3's ENS resolution path
+            contract = self.w3.eth.contract(
+                address=checksum_address(key),
+                abi=_BALANCE_OF_ABI
+            )
+            self._token_contracts[key] = contract
+        return contract
+
     def get_token_balance(self, token_address: str, wallet_address: str, decimals: int = 18) -> float:
         """Get ERC-20 token balance"""
         try:
-            # ERC-20 balanceOf function signature
-            balance_of_abi = [
-                {
-                    'constant': True,
-                    'inputs': [{'name': '_owner', 'type': 'address'}],
-                    'name': 'balanceOf',
-                    'outputs': [{'name': 'balance', 'type': 'uint256'}],
-                    'type': 'function'
-                }
-            ]
-            
-            contract = self.w3.eth.contract(
-                address=Web3.to_checksum_address(token_address),
-                abi=balance_of_abi
-            )
-            
-            balance = contract.functions.balanceOf(Web3.to_checksum_address(wallet_address)).call()
+            contract = self._get_token_contract(token_address)
+            balance = contract.functions.balanceOf(checksum_address(wallet_address.lower())).call()
             return balance / (10 ** decimals)
         except Exception as e:
             logger.error(f"Error getting token balance: {e}")
@@ -155,4 +525,6 @@ class BaseRPCConnector:
     async def close(self):
         """Close connection"""
         logger.info("Closing RPC connection")
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
         # Web3.py doesn't require explicit closing for HTTP provider
\ No newline at end of file
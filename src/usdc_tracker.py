@@ -4,15 +4,50 @@ USDC Transfer Tracker
 Monitors USDC (ERC-20) transfers on Base network
 """
 
+import asyncio
 import logging
+from decimal import Decimal
 from typing import Dict, List, Optional
+import numpy as np
 from web3 import Web3
 import os
-from dotenv import load_dotenv
+try:
+    from . import config
+except ImportError:
+    import config
+
+try:
+    from .rpc_connector import RPCError, checksum_address
+except ImportError:
+    from rpc_connector import RPCError, checksum_address
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Bounds for the adaptive eth_getLogs window size
+_MIN_LOG_SPAN = 128
+_MAX_LOG_SPAN = 10_000
+
+# Multicall3 is deployed at the same address on Base as on most chains
+_MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+# Function selectors: aggregate3((address,bool,bytes)[]) and balanceOf(address)
+_AGGREGATE3_SELECTOR = '82ad56cb'
+_BALANCE_OF_SELECTOR = '70a08231'
+
+
+def _is_oversized_error(exc: BaseException) -> bool:
+    """True when the provider rejected a getLogs window for being too big"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    if isinstance(exc, RPCError):
+        message = exc.message.lower() if exc.message else ''
+        return (
+            exc.code == -32005
+            or 'more than' in message
+            or 'too many' in message
+            or 'timeout' in message
+        )
+    return False
+
 
 class USDCTracker:
     """
@@ -26,7 +61,12 @@ class USDCTracker:
         self.rpc = rpc_connector
         self.usdc_address = os.getenv('USDC_CONTRACT_ADDRESS', '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913')
         self.usdc_decimals = int(os.getenv('USDC_DECIMALS', '6'))
-        
+
+        # Adaptive eth_getLogs window: halved when the provider rejects a
+        # window as too large, doubled again after clean rounds, so the
+        # tracker converges on the biggest span the endpoint will serve
+        self._log_span = int(os.getenv('USDC_LOG_CHUNK_BLOCKS', '2000'))
+
         logger.info(f"Initialized USDC Tracker for contract: {self.usdc_address}")
     
     async def get_transfers(self, from_block: int, to_block: int, 
@@ -43,60 +83,230 @@ class USDCTracker:
             List of transfer events
         """
         try:
-            # Create filter for Transfer events
-            filter_params = {
-                'address': Web3.to_checksum_address(self.usdc_address),
-                'fromBlock': from_block,
-                'toBlock': to_block,
-                'topics': [self.TRANSFER_EVENT_SIGNATURE]
-            }
-            
-            # Get logs
-            logs = await self.rpc.get_logs(filter_params)
-            
-            # Parse transfers
-            transfers = []
-            for log in logs:
-                transfer = self._parse_transfer_log(log)
-                
-                # Filter by addresses if specified
-                if addresses:
-                    if transfer['from'] in addresses or transfer['to'] in addresses:
-                        transfers.append(transfer)
-                else:
-                    transfers.append(transfer)
-            
+            if addresses:
+                # from/to are indexed, so the node can filter server-side:
+                # a padded-address list in a topic slot is an OR filter.
+                # Direction can't be expressed in one query, so sent and
+                # received are fetched concurrently and self-transfers
+                # (matching both) deduped.
+                padded = [self._pad_address(a) for a in addresses]
+                sent, received = await asyncio.gather(
+                    self._get_logs_chunked(
+                        from_block, to_block,
+                        topics=[self.TRANSFER_EVENT_SIGNATURE, padded]
+                    ),
+                    self._get_logs_chunked(
+                        from_block, to_block,
+                        topics=[self.TRANSFER_EVENT_SIGNATURE, None, padded]
+                    )
+                )
+
+                seen = set()
+                logs = []
+                for log in sent + received:
+                    key = (log['transactionHash'], log['logIndex'])
+                    if key not in seen:
+                        seen.add(key)
+                        logs.append(log)
+            else:
+                logs = await self._get_logs_chunked(from_block, to_block)
+
+            # Restore chain order across windows before parsing
+            logs.sort(key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)))
+
+            transfers = self._parse_transfer_logs_batch(logs)
+
+            if addresses:
+                # Label each transfer with the watched address that
+                # matched, in the caller's original spelling — saves
+                # consumers re-deriving which side of the filter hit
+                by_lower = {a.lower(): a for a in addresses}
+                for transfer in transfers:
+                    transfer['watched'] = (
+                        by_lower.get(transfer['from'].lower())
+                        or by_lower.get(transfer['to'].lower())
+                    )
+
             return transfers
-            
+
         except Exception as e:
             logger.error(f"Error getting transfers: {e}", exc_info=True)
             return []
+
+    def to_decimal(self, amount_raw: int) -> Decimal:
+        """
+        Exact USDC amount from integer base units
+
+        For display and export paths that can't tolerate float rounding;
+        hot-path comparisons should stay on amountRaw directly.
+        """
+        return Decimal(amount_raw).scaleb(-self.usdc_decimals)
+
+    @staticmethod
+    def _pad_address(address: str) -> str:
+        """Left-pad an address to the 32-byte hex form used in topics"""
+        return '0x' + address.lower().removeprefix('0x').rjust(64, '0')
+
+    async def _get_logs_chunked(self, from_block: int, to_block: int,
+                                topics: Optional[List] = None) -> List[Dict]:
+        """
+        Fetch Transfer logs over a range with adaptive window sizing
+
+        The range is cut into windows of the current span and the windows
+        are fetched concurrently. A window the provider rejects as too
+        large ("query returned more than ...", code -32005, timeouts) is
+        split in half recursively, and the shared span shrinks so later
+        windows start smaller; a round with no splits grows the span back
+        toward _MAX_LOG_SPAN.
+        """
+        if to_block < from_block:
+            return []
+
+        if topics is None:
+            topics = [self.TRANSFER_EVENT_SIGNATURE]
+
+        span = self._log_span
+        windows = [
+            (start, min(start + span - 1, to_block))
+            for start in range(from_block, to_block + 1, span)
+        ]
+
+        results = await asyncio.gather(
+            *[self._get_logs_window(start, end, topics) for start, end in windows]
+        )
+
+        if self._log_span == span:
+            # No window had to split this round — try a bigger span next time
+            self._log_span = min(span * 2, _MAX_LOG_SPAN)
+
+        return [log for logs in results for log in logs]
+
+    async def _get_logs_window(self, from_block: int, to_block: int,
+                               topics: List) -> List[Dict]:
+        """Fetch one window, bisecting when the provider rejects it"""
+        filter_params = {
+            'address': Web3.to_checksum_address(self.usdc_address),
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': topics
+        }
+
+        try:
+            return await self.rpc.get_logs(filter_params, raise_on_error=True)
+        except Exception as e:
+            if not _is_oversized_error(e) or from_block >= to_block:
+                raise
+
+            self._log_span = max(self._log_span // 2, _MIN_LOG_SPAN)
+            logger.debug(
+                "getLogs window %d-%d too large, splitting (span now %d)",
+                from_block, to_block, self._log_span
+            )
+
+            mid = (from_block + to_block) // 2
+            first, second = await asyncio.gather(
+                self._get_logs_window(from_block, mid, topics),
+                self._get_logs_window(mid + 1, to_block, topics)
+            )
+            return first + second
     
+    async def get_transfers_batch(self, ranges: List[tuple]) -> List[List[Dict]]:
+        """
+        Get USDC transfers for multiple block ranges in one JSON-RPC batch
+
+        Sends all eth_getLogs calls as a single HTTP request via
+        rpc.batch_call, so a wave of N windows costs one round-trip.
+
+        Args:
+            ranges: List of (from_block, to_block) tuples
+
+        Returns:
+            List of transfer lists, one per input range
+        """
+        try:
+            address = Web3.to_checksum_address(self.usdc_address)
+            requests = [
+                ('eth_getLogs', [{
+                    'address': address,
+                    'fromBlock': hex(from_block),
+                    'toBlock': hex(to_block),
+                    'topics': [self.TRANSFER_EVENT_SIGNATURE]
+                }])
+                for from_block, to_block in ranges
+            ]
+
+            results = await self.rpc.batch_call(requests)
+
+            return [self._parse_transfer_logs_batch(logs or []) for logs in results]
+
+        except Exception as e:
+            logger.error(f"Error getting batched transfers: {e}", exc_info=True)
+            return [[] for _ in ranges]
+
+    def _parse_transfer_logs_batch(self, logs: List[Dict]) -> List[Dict]:
+        """
+        Parse many raw Transfer logs in one pass
+
+        Hot-loop variant of _parse_transfer_log: the decimal scale and
+        checksum function are hoisted out of the loop, and checksum
+        encoding — a keccak per address, the most expensive step of
+        parsing — goes through the process-wide checksum_address cache,
+        since the same addresses repeat heavily across transfer streams.
+        Malformed logs are skipped.
+        """
+        scale = 10 ** self.usdc_decimals
+        checksum = checksum_address
+        transfers = []
+
+        for log in logs:
+            try:
+                topics = log['topics']
+                from_addr = checksum('0x' + topics[1][-40:])
+                to_addr = checksum('0x' + topics[2][-40:])
+
+                amount_raw = int(log['data'], 16)
+
+                transfers.append({
+                    'transactionHash': log['transactionHash'],
+                    'blockNumber': int(log['blockNumber'], 16),
+                    'logIndex': int(log['logIndex'], 16),
+                    'from': from_addr,
+                    'to': to_addr,
+                    'amount': amount_raw / scale,
+                    'amountRaw': amount_raw
+                })
+            except Exception as e:
+                logger.error("Error parsing transfer log: %s", e)
+
+        return transfers
+
     def _parse_transfer_log(self, log: Dict) -> Dict:
         """
-        Parse a Transfer event log
-        
+        Parse a raw JSON-RPC Transfer event log
+
         Log structure:
         - topics[0]: Event signature
         - topics[1]: From address (padded)
         - topics[2]: To address (padded)
         - data: Amount (uint256)
+
+        Topics, data and block numbers arrive as hex strings.
         """
         try:
             # Extract addresses from topics (remove padding)
-            from_address = '0x' + log['topics'][1].hex()[-40:]
-            to_address = '0x' + log['topics'][2].hex()[-40:]
-            
+            from_address = '0x' + log['topics'][1][-40:]
+            to_address = '0x' + log['topics'][2][-40:]
+
             # Decode amount from data
-            amount_raw = int(log['data'].hex(), 16)
+            amount_raw = int(log['data'], 16)
             amount = amount_raw / (10 ** self.usdc_decimals)
-            
+
             return {
-                'transactionHash': log['transactionHash'].hex(),
-                'blockNumber': log['blockNumber'],
-                'logIndex': log['logIndex'],
-                'from': Web3.to_checksum_address(from_address),
-                'to': Web3.to_checksum_address(to_address),
+                'transactionHash': log['transactionHash'],
+                'blockNumber': int(log['blockNumber'], 16),
+                'logIndex': int(log['logIndex'], 16),
+                'from': checksum_address(from_address),
+                'to': checksum_address(to_address),
                 'amount': amount,
                 'amountRaw': amount_raw
             }
@@ -104,6 +314,48 @@ class USDCTracker:
             logger.error(f"Error parsing transfer log: {e}")
             return {}
     
+    async def subscribe_transfers(self, addresses: Optional[List[str]] = None):
+        """
+        Stream USDC transfers as the node pushes them over WebSocket
+
+        Async generator built on rpc.subscribe_logs — replaces polling
+        loops with push notifications.
+
+        Args:
+            addresses: Optional list of addresses to filter (monitors both
+                from and to; direction can't be expressed in one topic
+                filter, so filtering happens on the parsed transfer)
+
+        Yields:
+            Parsed transfer events
+        """
+        # Raw-topic pre-filter as in get_transfers, built once: bare
+        # lowercase topic slice -> the caller's original spelling, so
+        # membership and the watched label are the same dict lookup
+        wanted = (
+            {a.lower().removeprefix('0x'): a for a in addresses}
+            if addresses else None
+        )
+
+        async for log in self.rpc.subscribe_logs(
+            address=self.usdc_address,
+            topics=[self.TRANSFER_EVENT_SIGNATURE]
+        ):
+            watched = None
+            if wanted is not None:
+                topics = log.get('topics') or []
+                if len(topics) < 3:
+                    continue
+                watched = wanted.get(topics[1][-40:]) or wanted.get(topics[2][-40:])
+                if watched is None:
+                    continue
+
+            transfer = self._parse_transfer_log(log)
+            if transfer:
+                if watched is not None:
+                    transfer['watched'] = watched
+                yield transfer
+
     async def get_balance(self, address: str) -> float:
         """
         Get USDC balance for an address
@@ -118,22 +370,175 @@ class USDCTracker:
         except Exception as e:
             logger.error(f"Error getting USDC balance for {address}: {e}")
             return 0.0
-    
+
+    async def get_balances(self, addresses: List[str]) -> Dict[str, float]:
+        """
+        Get USDC balances for many addresses in one eth_call
+
+        Packs the balanceOf calls into a single Multicall3 aggregate3
+        call, so N balances cost one round-trip and one JSON decode
+        instead of N eth_calls. Falls back to a batched JSON-RPC request
+        of individual eth_calls if the multicall fails.
+
+        Args:
+            addresses: Wallet addresses to query
+
+        Returns:
+            Mapping of input address -> balance in USDC
+        """
+        if not addresses:
+            return {}
+
+        scale = 10 ** self.usdc_decimals
+        calldatas = [
+            _BALANCE_OF_SELECTOR + addr.lower().removeprefix('0x').rjust(64, '0')
+            for addr in addresses
+        ]
+
+        try:
+            data = self._encode_aggregate3(calldatas)
+            raw = await self.rpc.call(
+                'eth_call', [{'to': _MULTICALL3_ADDRESS, 'data': data}, 'latest']
+            )
+            if raw:
+                amounts = self._decode_aggregate3(raw)
+                if len(amounts) == len(addresses):
+                    return {
+                        addr: (amount / scale if amount is not None else 0.0)
+                        for addr, amount in zip(addresses, amounts)
+                    }
+        except Exception as e:
+            logger.error("Multicall balance lookup failed: %s", e)
+
+        # Fallback: individual eth_calls, still one HTTP POST via batching
+        usdc = Web3.to_checksum_address(self.usdc_address)
+        results = await self.rpc.batch_call([
+            ('eth_call', [{'to': usdc, 'data': '0x' + calldata}, 'latest'])
+            for calldata in calldatas
+        ])
+        return {
+            addr: (int(result, 16) / scale if result else 0.0)
+            for addr, result in zip(addresses, results)
+        }
+
+    def _encode_aggregate3(self, calldatas: List[str]) -> str:
+        """
+        ABI-encode Multicall3.aggregate3 for calls against the USDC contract
+
+        Argument layout: one dynamic array of (address target, bool
+        allowFailure, bytes callData) structs. Calldatas are bare hex
+        (no 0x prefix).
+        """
+        target = self.usdc_address.lower().removeprefix('0x').rjust(64, '0')
+
+        structs = []
+        for calldata in calldatas:
+            length = len(calldata) // 2
+            padded = calldata.ljust(((length + 31) // 32) * 64, '0')
+            structs.append(
+                target
+                + '1'.rjust(64, '0')       # allowFailure: one bad wallet
+                                           # shouldn't revert the batch
+                + '60'.rjust(64, '0')      # offset of callData within struct
+                + format(length, 'x').rjust(64, '0')
+                + padded
+            )
+
+        # Struct offsets are relative to the start of the array contents
+        # (just after the length word)
+        offsets = []
+        position = 32 * len(structs)
+        for struct in structs:
+            offsets.append(format(position, 'x').rjust(64, '0'))
+            position += len(struct) // 2
+
+        return (
+            '0x' + _AGGREGATE3_SELECTOR
+            + '20'.rjust(64, '0')          # offset of the array argument
+            + format(len(structs), 'x').rjust(64, '0')
+            + ''.join(offsets)
+            + ''.join(structs)
+        )
+
+    @staticmethod
+    def _decode_aggregate3(raw: str) -> List[Optional[int]]:
+        """
+        Decode aggregate3's (bool success, bytes returnData)[] result
+
+        Returns one int per call, or None where the call failed or
+        returned no data.
+        """
+        buf = bytes.fromhex(raw.removeprefix('0x'))
+
+        def word(offset: int) -> int:
+            return int.from_bytes(buf[offset:offset + 32], 'big')
+
+        array = word(0)
+        count = word(array)
+        base = array + 32
+
+        amounts = []
+        for i in range(count):
+            struct = base + word(base + 32 * i)
+            success = word(struct)
+            data_at = struct + word(struct + 32)
+            length = word(data_at)
+            if success and length >= 32:
+                amounts.append(word(data_at + 32))
+            else:
+                amounts.append(None)
+        return amounts
+
+
     async def track_address(self, address: str, from_block: int = 0) -> List[Dict]:
         """
         Get all USDC transfers for a specific address
+
+        Filters at the source: the address is padded into the indexed
+        from/to topics of two parallel eth_getLogs calls, so the node only
+        returns this address's transfers instead of every USDC transfer
+        in the range.
         """
         try:
             current_block = await self.rpc.get_latest_block_number()
-            
+
             logger.info(f"Tracking USDC transfers for {address} from block {from_block} to {current_block}")
-            
-            transfers = await self.get_transfers(
-                from_block=from_block,
-                to_block=current_block,
-                addresses=[address]
+
+            # Addresses are left-padded to 32 bytes in indexed topics
+            padded = self._pad_address(address)
+            usdc = Web3.to_checksum_address(self.usdc_address)
+
+            sent_logs, received_logs = await asyncio.gather(
+                self.rpc.get_logs({
+                    'address': usdc,
+                    'fromBlock': from_block,
+                    'toBlock': current_block,
+                    'topics': [self.TRANSFER_EVENT_SIGNATURE, padded]
+                }),
+                self.rpc.get_logs({
+                    'address': usdc,
+                    'fromBlock': from_block,
+                    'toBlock': current_block,
+                    'topics': [self.TRANSFER_EVENT_SIGNATURE, None, padded]
+                })
             )
-            
+
+            # Merge the directions and dedupe self-transfers, which match
+            # both topic filters
+            transfers = []
+            seen = set()
+            for log in sent_logs + received_logs:
+                transfer = self._parse_transfer_log(log)
+                if not transfer:
+                    continue
+
+                key = (transfer['transactionHash'], transfer['logIndex'])
+                if key in seen:
+                    continue
+                seen.add(key)
+                transfers.append(transfer)
+
+            transfers.sort(key=lambda t: (t['blockNumber'], t['logIndex']))
             return transfers
         except Exception as e:
             logger.error(f"Error tracking address: {e}")
@@ -157,26 +562,63 @@ class USDCTracker:
             logger.error(f"Error getting recent transfers: {e}")
             return []
     
-    def filter_by_amount(self, transfers: List[Dict], min_amount: float = None, 
+    def filter_by_amount(self, transfers: List[Dict], min_amount: float = None,
                         max_amount: float = None, exact_amount: float = None) -> List[Dict]:
         """
         Filter transfers by amount
+
+        Thresholds are given in USDC but converted once to integer base
+        units and compared against amountRaw, so the per-row test is
+        exact integer arithmetic instead of fuzzy float epsilons. Large
+        batches run the comparisons as one NumPy mask over a contiguous
+        int64 column instead of an interpreted branch per row.
         """
+        scale = 10 ** self.usdc_decimals
+
+        def raw_amount(transfer: Dict) -> int:
+            raw = transfer.get('amountRaw')
+            if raw is None:
+                raw = round(transfer.get('amount', 0) * scale)
+            return raw
+
+        # Same ±0.01 USDC tolerance as before, in base units
+        target = round(exact_amount * scale) if exact_amount is not None else None
+        tolerance = scale // 100
+        min_raw = round(min_amount * scale) if min_amount is not None else None
+        max_raw = round(max_amount * scale) if max_amount is not None else None
+
+        if len(transfers) >= 1024:
+            try:
+                raws = np.fromiter(
+                    (raw_amount(t) for t in transfers),
+                    dtype=np.int64, count=len(transfers)
+                )
+                if target is not None:
+                    mask = np.abs(raws - target) <= tolerance
+                else:
+                    mask = np.ones(len(transfers), dtype=bool)
+                    if min_raw is not None:
+                        mask &= raws >= min_raw
+                    if max_raw is not None:
+                        mask &= raws <= max_raw
+                return [transfers[i] for i in np.flatnonzero(mask)]
+            except OverflowError:
+                # amountRaw beyond int64 (malformed log) — scalar path
+                # below handles arbitrary precision
+                pass
+
+        if target is not None:
+            return [t for t in transfers if abs(raw_amount(t) - target) <= tolerance]
+
         filtered = []
-        
         for transfer in transfers:
-            amount = transfer.get('amount', 0)
-            
-            if exact_amount is not None:
-                if abs(amount - exact_amount) < 0.01:  # Allow small floating point difference
-                    filtered.append(transfer)
-            else:
-                if min_amount is not None and amount < min_amount:
-                    continue
-                if max_amount is not None and amount > max_amount:
-                    continue
-                filtered.append(transfer)
-        
+            raw = raw_amount(transfer)
+            if min_raw is not None and raw < min_raw:
+                continue
+            if max_raw is not None and raw > max_raw:
+                continue
+            filtered.append(transfer)
+
         return filtered
     
     async def get_100_usdc_transfers(self, from_block: int, to_block: int) -> List[Dict]: